@@ -1,5 +1,31 @@
 from django.contrib import admin
-from .models import Post, Group
+from django.http import StreamingHttpResponse
+from .models import Post, Group, Comment, Follow
+from .export import lines, rows
+from .search import SearchResults
+
+
+def export_action(name, format_, content_type):
+    """Действие админки: выгрузка выбранных строк EXPORTS[name] потоком."""
+    def action(modeladmin, request, queryset):
+        response = StreamingHttpResponse(
+            lines(name, rows(name, queryset=queryset), format_),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{name}.{format_}"'
+        )
+        return response
+    action.__name__ = f"export_{format_}"
+    action.short_description = f"Выгрузить в {format_.upper()}"
+    return action
+
+
+def export_actions(name):
+    return (
+        export_action(name, "jsonl", "application/x-ndjson; charset=utf-8"),
+        export_action(name, "csv", "text/csv; charset=utf-8"),
+    )
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -7,9 +33,28 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ("text",) 
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
+    actions = export_actions("posts")
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return SearchResults(search_term).filter_posts(queryset), False
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("pk", "title", "slug", "description")
 
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ("pk", "text", "created", "author", "post")
+    list_filter = ("created",)
+    raw_id_fields = ("post", "author")
+    actions = export_actions("comments")
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ("pk", "user", "author")
+    raw_id_fields = ("user", "author")
+    actions = export_actions("follows")
+
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group, GroupAdmin)
\ No newline at end of file
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
\ No newline at end of file
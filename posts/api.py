@@ -0,0 +1,217 @@
+import json
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods
+
+from . import feeds, follows
+from .caching import (follow_list_namespaces, follow_namespaces,
+                      group_namespaces, index_namespaces,
+                      post_view_namespaces, profile_namespaces)
+from .conditional import conditional
+from .models import Post, User
+from .paginator import POSTS_PER_PAGE, USERS_PER_PAGE, CursorPaginator
+
+# Сколько авторов можно передать в один запрос к api/following/.
+FOLLOW_BATCH_LIMIT = 100
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={"ensure_ascii": False}
+    )
+
+
+def login_required(view):
+    """Как django login_required, но вместо редиректа отвечает 401."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return json_response(
+                {"detail": "Требуется авторизация."}, status=401
+            )
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def serialize_post(post):
+    return {
+        "id": post.pk,
+        "author": post.author.username,
+        "text": post.text,
+        "pub_date": post.pub_date.isoformat(),
+        "group": post.group.slug if post.group_id else None,
+        "image": post.image.url if post.image else None,
+        "comments_count": post.comments_count,
+        "url": reverse("post", args=[post.author.username, post.pk]),
+    }
+
+
+def serialize_user(user):
+    return {
+        "username": user.username,
+        "full_name": user.get_full_name(),
+        "followed_by_viewer": user.is_followed,
+        "url": reverse("profile", args=[user.username]),
+    }
+
+
+def serialize_comment(comment):
+    return {
+        "id": comment.pk,
+        "author": comment.author.username,
+        "text": comment.text,
+        "created": comment.created.isoformat(),
+    }
+
+
+def page_response(request, object_list, serialize,
+                  ordering=("-pub_date", "-id"), per_page=POSTS_PER_PAGE,
+                  prepare=None, **extra):
+    """Страница по курсору: ``results`` плюс ссылки ``next``/``previous``.
+
+    ``prepare`` получает строки страницы списком и возвращает то, что
+    сериализуется, — например, дополняет их одним запросом на страницу.
+    """
+    page = CursorPaginator(object_list, per_page, ordering).get_page(
+        request.GET.get("cursor")
+    )
+    rows = list(page) if prepare is None else prepare(list(page))
+
+    def link(cursor):
+        if cursor is None:
+            return None
+        return f"{request.path}?{urlencode({'cursor': cursor})}"
+
+    return json_response({
+        **extra,
+        "results": [serialize(obj) for obj in rows],
+        "next": link(page.next_cursor),
+        "previous": link(page.previous_cursor),
+    })
+
+
+@conditional(index_namespaces)
+def index(request):
+    return page_response(request, feeds.index_feed(), serialize_post)
+
+
+@conditional(group_namespaces)
+def group_posts(request, slug):
+    group = feeds.get_group(slug)
+    return page_response(
+        request,
+        feeds.group_feed(group),
+        serialize_post,
+        group={
+            "slug": group.slug,
+            "title": group.title,
+            "description": group.description,
+        },
+    )
+
+
+@conditional(profile_namespaces)
+def profile(request, username):
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+    return page_response(
+        request,
+        feeds.profile_feed(author),
+        serialize_post,
+        author={
+            "username": author.username,
+            "full_name": author.get_full_name(),
+            "posts_count": author.stats.posts_count,
+            "followers_count": author.stats.followers_count,
+            "following_count": author.stats.following_count,
+        },
+    )
+
+
+@conditional(post_view_namespaces)
+def post_view(request, username, post_id):
+    post = feeds.get_post(username, post_id)
+    return page_response(
+        request,
+        feeds.comment_feed(post),
+        serialize_comment,
+        ordering=feeds.COMMENT_ORDERING,
+        post=serialize_post(post),
+    )
+
+
+def user_page_response(request, username, feed, field):
+    author = get_object_or_404(User, username=username)
+    return page_response(
+        request,
+        feed(author),
+        serialize_user,
+        ordering=feeds.FOLLOW_ORDERING,
+        per_page=USERS_PER_PAGE,
+        prepare=lambda relations: feeds.mark_followed(
+            request.user, [getattr(relation, field) for relation in relations]
+        ),
+        author=author.username,
+    )
+
+
+@conditional(follow_list_namespaces, per_user=True)
+def followers(request, username):
+    return user_page_response(
+        request, username, feeds.followers_feed, "user"
+    )
+
+
+@conditional(follow_list_namespaces, per_user=True)
+def following_list(request, username):
+    return user_page_response(
+        request, username, feeds.following_feed, "author"
+    )
+
+
+@login_required
+@conditional(follow_namespaces, per_user=True)
+def follow_index(request):
+    return page_response(
+        request, feeds.follow_feed(request.user), serialize_post
+    )
+
+
+@login_required
+@require_http_methods(["POST", "DELETE"])
+def following(request):
+    """Подписка (POST) или отписка (DELETE) сразу на многих авторов.
+
+    Тело запроса — JSON вида {"authors": ["username", ...]}. Повторы
+    безопасны: уже оформленные подписки и несуществующие пропускаются.
+    """
+    try:
+        usernames = json.loads(request.body)["authors"]
+    except (ValueError, KeyError, TypeError):
+        usernames = None
+    if (not isinstance(usernames, list)
+            or not all(isinstance(name, str) for name in usernames)):
+        return json_response(
+            {"detail": "Нужен JSON вида {\"authors\": [\"username\", ...]}."},
+            status=400,
+        )
+    if len(usernames) > FOLLOW_BATCH_LIMIT:
+        return json_response(
+            {"detail": f"Не больше {FOLLOW_BATCH_LIMIT} авторов за раз."},
+            status=400,
+        )
+    authors = list(User.objects.filter(username__in=usernames).only(
+        "pk", "username"
+    ))
+    change = follows.follow if request.method == "POST" else follows.unfollow
+    return json_response({
+        "changed": change(request.user, authors),
+        "not_found": sorted(
+            set(usernames) - {author.username for author in authors}
+        ),
+    })
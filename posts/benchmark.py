@@ -0,0 +1,169 @@
+import json
+import random
+import statistics
+import time
+
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from . import urls
+from .caching import bump
+from .models import Group, Post, User
+
+# Ответы, которые считаются успешными: редиректы у форм и подписок — норма.
+OK_STATUSES = (200, 301, 302, 304)
+
+
+def percentile(samples, share):
+    """Перцентиль по ближайшему рангу; samples уже отсортированы."""
+    index = max(0, min(len(samples) - 1, round(share * len(samples)) - 1))
+    return samples[index]
+
+
+class Benchmark:
+    """Прогон запросов ко всем адресам posts/urls.py через тестовый клиент.
+
+    Параметры адресов (автор, пост, группа) каждый раз выбираются заново
+    из выборки реальных данных, поэтому в замер попадают и горячий кеш,
+    и холодный. Запросы идут от имени самого активного подписчика, с
+    DEBUG=False. Всё выполняется в транзакции, которая потом
+    откатывается; версии кеша, которые успели поднять запросы на запись,
+    поднимаются ещё раз, чтобы в кеше не осталось страниц с откаченными
+    данными.
+    """
+
+    def __init__(self, requests=50, warmup=3, sample=50, names=None,
+                 seed=None):
+        self.requests = requests
+        self.warmup = warmup
+        self.sample = sample
+        self.names = names
+        self.random = random.Random(seed)
+        self.client = Client(HTTP_HOST="localhost")
+
+    def patterns(self):
+        for pattern in urls.urlpatterns:
+            if self.names and pattern.name not in self.names:
+                continue
+            yield pattern.name, set(pattern.pattern.converters)
+
+    def prepare(self):
+        self.viewer = User.objects.order_by(
+            "-stats__following_count", "pk"
+        ).first()
+        self.client.force_login(self.viewer)
+        self.posts = list(Post.objects.order_by("?").values_list(
+            "pk", "author__username"
+        )[:self.sample])
+        self.own_posts = list(Post.objects.filter(
+            author=self.viewer
+        ).values_list("pk", "author__username")[:self.sample])
+        self.authors = list(User.objects.filter(
+            posts__isnull=False
+        ).exclude(pk=self.viewer.pk).distinct().values_list(
+            "username", flat=True
+        )[:self.sample])
+        self.slugs = list(Group.objects.values_list(
+            "slug", flat=True
+        )[:self.sample])
+
+    def kwargs(self, name, converters):
+        kwargs = {}
+        if "post_id" in converters:
+            posts = (name == "post_edit" and self.own_posts) or self.posts
+            kwargs["post_id"], kwargs["username"] = self.random.choice(posts)
+        elif "username" in converters:
+            kwargs["username"] = self.random.choice(self.authors)
+        if "slug" in converters:
+            kwargs["slug"] = self.random.choice(self.slugs)
+        return kwargs
+
+    def request(self, name, converters):
+        kwargs = self.kwargs(name, converters)
+        url = reverse(name, kwargs=kwargs)
+        if name == "search":
+            return self.client.get(url, {"q": self.random.choice(
+                ["кеш", "лента подписка", "индекс"]
+            )})
+        if name == "add_comment":
+            return self.client.post(url, {"text": "замер"})
+        if name == "api_following":
+            return self.client.post(url, json.dumps({
+                "authors": self.random.sample(
+                    self.authors, min(10, len(self.authors))
+                ),
+            }), content_type="application/json")
+        return self.client.get(url)
+
+    def measure(self, name, converters):
+        for _ in range(self.warmup):
+            self.request(name, converters)
+        timings = []
+        queries = []
+        errors = 0
+        for _ in range(self.requests):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = self.request(name, converters)
+                timings.append(time.perf_counter() - started)
+            queries.append(len(captured))
+            errors += response.status_code not in OK_STATUSES
+        timings.sort()
+        return {
+            "requests": len(timings),
+            "p50": percentile(timings, 0.50) * 1000,
+            "p95": percentile(timings, 0.95) * 1000,
+            "p99": percentile(timings, 0.99) * 1000,
+            "queries": statistics.mean(queries),
+            "rps": len(timings) / sum(timings),
+            "errors": errors,
+        }
+
+    def run(self):
+        self.prepare()
+        results = {}
+        # Как в бою: без debug toolbar и с кешем шаблонов.
+        with override_settings(DEBUG=False), transaction.atomic():
+            for name, converters in self.patterns():
+                results[name] = self.measure(name, converters)
+            transaction.set_rollback(True)
+        bump(
+            "index", "groups", f"follow:{self.viewer.pk}",
+            *(f"profile:{username}" for username in self.authors),
+            *(f"profile:{username}" for _, username in self.posts),
+            *(f"group:{slug}" for slug in self.slugs),
+        )
+        return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Адреса, где p95 вырос больше чем на ``tolerance`` или стало
+    больше запросов к базе, чем в ``baseline``."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {before['p95']:.1f} -> {current['p95']:.1f} мс"
+            )
+        if current["queries"] > before["queries"] + 0.5:
+            regressions.append(
+                f"{name}: запросов {before['queries']:.1f} -> "
+                f"{current['queries']:.1f}"
+            )
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as stream:
+        return json.load(stream)
+
+
+def save_baseline(results, path):
+    with open(path, "w", encoding="utf-8") as stream:
+        json.dump(results, stream, ensure_ascii=False, indent=2,
+                  sort_keys=True)
@@ -0,0 +1,202 @@
+import gzip
+import json
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import connection, transaction
+
+from . import search
+from .caching import bump
+from .counters import recount_posts, recount_users
+from .timeline import rebuild
+
+# Модели, которые грузятся пачками, в порядке зависимостей.
+LOAD_ORDER = (
+    "auth.user",
+    "posts.group",
+    "posts.post",
+    "posts.comment",
+    "posts.follow",
+)
+
+
+@contextmanager
+def raw_dates(*models):
+    """Пока активен, bulk_create пишет даты как есть.
+
+    auto_now/auto_now_add срабатывают и в bulk_create, поэтому без этого
+    все загруженные посты получили бы текущую дату.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False)
+        or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def open_dump(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    """Элементы JSON-массива по одному, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("Ожидался JSON-массив")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # Число на границе куска могло прочитаться не целиком.
+                if end < len(buffer) or eof:
+                    yield obj
+                    position = end
+                    continue
+        elif eof:
+            raise ValueError("JSON-массив не закрыт")
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+class BulkLoader:
+    """Загрузка дампа dumpdata пачками через executemany.
+
+    Сигналы не срабатывают (save() не вызывается), поэтому счётчики,
+    ленты и поисковый индекс надо пересобрать отдельно. Всё идёт в одной
+    транзакции: внешние ключи проверяются при коммите, и порядок объектов
+    в файле не важен, но пачки родителей всё равно пишутся раньше детей.
+    """
+
+    def __init__(self, batch_size=1000, ignore_conflicts=False):
+        self.batch_size = batch_size
+        self.ignore_conflicts = ignore_conflicts
+        self.models = [apps.get_model(label) for label in LOAD_ORDER]
+        self.buffers = {model: [] for model in self.models}
+        self.loaded = dict.fromkeys(self.models, 0)
+        self.statements = {
+            model: self._insert_sql(model) for model in self.models
+        }
+        self.skipped = 0
+
+    def _wanted(self, objects):
+        labels = set(LOAD_ORDER)
+        for obj in objects:
+            if obj.get("model") in labels:
+                yield obj
+            else:
+                self.skipped += 1
+
+    def _insert_sql(self, model):
+        ops = connection.ops
+        fields = model._meta.concrete_fields
+        sql = "%s %s (%s) VALUES (%s)%s" % (
+            ops.insert_statement(ignore_conflicts=self.ignore_conflicts),
+            ops.quote_name(model._meta.db_table),
+            ", ".join(ops.quote_name(field.column) for field in fields),
+            ", ".join(["%s"] * len(fields)),
+            ops.ignore_conflicts_suffix_sql(
+                ignore_conflicts=self.ignore_conflicts
+            ),
+        )
+        return sql, fields
+
+    def insert(self, model, objects):
+        """То же, что bulk_create, но одним executemany.
+
+        Сборка многострочного INSERT в ORM занимает больше времени, чем
+        сама запись, а здесь SQL один на модель.
+        """
+        sql, fields = self.statements[model]
+        rows = [
+            [
+                field.get_db_prep_save(getattr(obj, field.attname), connection)
+                for field in fields
+            ]
+            for obj in objects
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def flush(self, upto=None):
+        for model in self.models:
+            buffer = self.buffers[model]
+            if buffer:
+                self.insert(model, buffer)
+                self.loaded[model] += len(buffer)
+                buffer.clear()
+            if model is upto:
+                return
+
+    def load(self, stream):
+        started = time.perf_counter()
+        with transaction.atomic():
+            for deserialized in Deserializer(
+                self._wanted(iter_json_array(stream)),
+                ignorenonexistent=True,
+            ):
+                model = type(deserialized.object)
+                buffer = self.buffers[model]
+                buffer.append(deserialized.object)
+                if len(buffer) >= self.batch_size:
+                    self.flush(upto=model)
+            self.flush()
+            self.reset_sequences()
+        return time.perf_counter() - started
+
+    def reset_sequences(self):
+        # Ключи пришли из файла: сдвигаем автоинкремент (нужно Postgres).
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), self.models
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def rebuild_derived():
+    """Пересчитать всё, что обычно поддерживают сигналы.
+
+    Нужно после записи в обход save(): bulk_load, seed.
+    """
+    with transaction.atomic():
+        recount_users()
+        recount_posts()
+    users = apps.get_model("auth.user").objects.filter(
+        follower__isnull=False
+    ).distinct()
+    for user in users.iterator():
+        with transaction.atomic():
+            rebuild(user)
+    search.rebuild()
+    bump("index", "groups")
@@ -0,0 +1,106 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from yatube.metrics import record_cache
+
+
+def version_key(namespace):
+    # В пространство имён попадают username и slug прямо из URL, а с
+    # пробелами и управляющими символами memcached ключ не примет.
+    return "version:" + hashlib.md5(namespace.encode()).hexdigest()
+
+
+def get_versions(namespaces):
+    """Текущие версии пространств имён; отсутствующие заводятся заново."""
+    keys = [version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in versions}
+    record_cache("version", len(keys) - len(missing), len(missing))
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(*namespaces):
+    """Сбрасывает всё, что закешировано под этими пространствами имён.
+
+    Версия меняется сразу и ещё раз после коммита: страница, собранная
+    между записью и коммитом по старым данным, не переживёт второй смены.
+    """
+    def set_versions():
+        now = time.time()
+        cache.set_many(
+            {version_key(namespace): now for namespace in namespaces}, None
+        )
+    set_versions()
+    transaction.on_commit(set_versions)
+
+
+def page_key(request, namespaces):
+    versions = get_versions(namespaces)
+    raw = "|".join([
+        request.get_full_path(),
+        str(request.user.pk or 0),
+        *map(repr, versions),
+    ])
+    return "page:" + hashlib.md5(raw.encode()).hexdigest()
+
+
+def cache_versioned(namespaces, timeout=None):
+    """Аналог cache_page, но ключ зависит от версий ``namespaces``.
+
+    ``namespaces`` — функция с сигнатурой вьюхи, возвращающая список
+    пространств имён, от которых зависит страница.
+    """
+    if timeout is None:
+        timeout = settings.PAGE_CACHE_TIMEOUT
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            key = page_key(request, namespaces(request, *args, **kwargs))
+            response = cache.get(key)
+            record_cache("page", response is not None, response is None)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    cache.set(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def index_namespaces(request):
+    return ["index", "groups"]
+
+
+def group_namespaces(request, slug):
+    return [f"group:{slug}", "groups"]
+
+
+def profile_namespaces(request, username):
+    return [f"profile:{username}", "groups"]
+
+
+def post_view_namespaces(request, username, post_id):
+    # Комментарии и правки поста сбрасывают версию профиля автора.
+    return profile_namespaces(request, username)
+
+
+def follow_list_namespaces(request, username):
+    # Списки меняются при (от)писке на автора, флаги — при подписках
+    # смотрящего.
+    return [f"profile:{username}", f"follow:{request.user.pk}"]
+
+
+def follow_namespaces(request):
+    # Лента подписок меняется вместе с общей лентой и при (от)писке.
+    return ["index", "groups", f"follow:{request.user.pk}"]
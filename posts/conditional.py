@@ -0,0 +1,48 @@
+import hashlib
+from datetime import datetime, timezone
+
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+from .caching import get_versions
+
+
+def _versions(request, namespaces, args, kwargs):
+    # ETag и Last-Modified считаются по одним и тем же версиям,
+    # читаем их из кеша один раз на запрос.
+    names = tuple(namespaces(request, *args, **kwargs))
+    memo = request.__dict__.setdefault("_namespace_versions", {})
+    if names not in memo:
+        memo[names] = get_versions(names)
+    return memo[names]
+
+
+def conditional(namespaces, per_user=False):
+    """condition() с ETag и Last-Modified по версиям ``namespaces``.
+
+    Версии меняются сигналами при любой правке, от которой зависит
+    страница, поэтому 304 отдаётся по одному чтению из кеша — до запросов
+    к базе и рендеринга. ``per_user`` — ответ зависит от того, кто смотрит.
+    Такие ответы вошедшему пользователю несут форму с CSRF-токеном, а
+    токен меняется при входе: в ETag идёт и CSRF-cookie, иначе 304 вернёт
+    страницу со старым токеном. Last-Modified у них не отдаётся — по
+    одной дате нельзя отличить ответы разным пользователям.
+    """
+    def etag(request, *args, **kwargs):
+        raw = "|".join(map(repr, _versions(request, namespaces, args, kwargs)))
+        if per_user:
+            raw += f"|{request.user.pk or 0}"
+            if request.user.is_authenticated:
+                # get_token заводит cookie, если её ещё нет, и страница
+                # отрендерится с тем же секретом, что попал в ETag.
+                get_token(request)
+                raw += f"|{request.META['CSRF_COOKIE']}"
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        versions = _versions(request, namespaces, args, kwargs)
+        return datetime.fromtimestamp(max(versions), tz=timezone.utc)
+
+    return condition(
+        etag_func=etag, last_modified_func=None if per_user else last_modified
+    )
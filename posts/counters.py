@@ -0,0 +1,83 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def _count(queryset, field):
+    """Подзапрос COUNT(*) по ``field`` = pk внешней строки."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def change_user_counter(user_id, field, delta):
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        if stats.filter(**{f"{field}__gte": -delta}).update(
+            **{field: F(field) + delta}
+        ):
+            return
+        # Строки нет, когда удаляется сам пользователь: каскад убрал её
+        # раньше постов и подписок, и создавать её заново нельзя.
+        if stats.exists():
+            recount_users(User.objects.filter(pk=user_id))
+        return
+    if not stats.update(**{field: F(field) + delta}):
+        # Строки статистики нет или счётчик уже разошёлся — пересчитываем.
+        recount_users(User.objects.filter(pk=user_id))
+
+
+def change_comments_count(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F("comments_count") + delta, modified=Now())
+
+
+def recount_users(users=None):
+    users = User.objects.all() if users is None else users
+    missing = users.filter(stats__isnull=True).values_list("pk", flat=True)
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in missing.iterator()),
+        ignore_conflicts=True,
+    )
+    stats = UserStats.objects.filter(user__in=users.values("pk"))
+    return stats.update(
+        posts_count=_count(Post.objects.all(), "author"),
+        followers_count=_count(Follow.objects.all(), "author"),
+        following_count=_count(Follow.objects.all(), "user"),
+    )
+
+
+def change_follow_counters(user_id, author_ids, delta):
+    """Сдвигает following_count у ``user_id`` и followers_count у авторов."""
+    if not author_ids:
+        return
+    change_user_counter(user_id, "following_count", delta * len(author_ids))
+    authors = UserStats.objects.filter(user_id__in=author_ids)
+    if delta < 0:
+        authors = authors.filter(followers_count__gte=-delta)
+    if authors.update(
+        followers_count=F("followers_count") + delta
+    ) < len(author_ids):
+        # Как в change_user_counter: пересчитываем разошедшиеся, но не
+        # заводим строки удаляемым пользователям.
+        users = User.objects.filter(pk__in=author_ids)
+        if delta < 0:
+            users = users.filter(stats__isnull=False)
+        recount_users(users)
+
+
+def recount_posts(posts=None):
+    posts = Post.objects.all() if posts is None else posts
+    return posts.update(
+        comments_count=_count(Comment.objects.all(), "post")
+    )
@@ -0,0 +1,68 @@
+import csv
+import json
+
+from .models import Comment, Follow, Post
+
+# Что выгружается: модель, колонки и поле даты для --since.
+EXPORTS = {
+    "posts": (
+        Post,
+        ("id", "author_id", "group_id", "text", "pub_date", "image",
+         "comments_count"),
+        "pub_date",
+    ),
+    "comments": (
+        Comment,
+        ("id", "post_id", "author_id", "text", "created"),
+        "created",
+    ),
+    # У подписок нет даты, они всегда выгружаются целиком.
+    "follows": (Follow, ("id", "user_id", "author_id"), None),
+}
+FORMATS = ("jsonl", "csv")
+
+
+def rows(name, since=None, queryset=None, chunk_size=2000):
+    """Строки выгрузки кортежами, в порядке колонок EXPORTS[name].
+
+    iterator() не кеширует результат и читает базу по ``chunk_size``
+    строк (на Postgres — серверным курсором), так что память не растёт
+    с размером таблицы.
+    """
+    model, columns, date_field = EXPORTS[name]
+    if queryset is None:
+        queryset = model.objects.all()
+    if since is not None and date_field is not None:
+        queryset = queryset.filter(**{f"{date_field}__gte": since})
+    return queryset.order_by("pk").values_list(*columns).iterator(
+        chunk_size=chunk_size
+    )
+
+
+def _plain(value):
+    # Даты целиком, с микросекундами: по ним делается следующая --since.
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: writerow возвращает готовую строку."""
+
+    def write(self, value):
+        return value
+
+
+def lines(name, rows, format_="jsonl"):
+    """Текст выгрузки построчно: для CSV первой идёт строка заголовка."""
+    columns = EXPORTS[name][1]
+    if format_ == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([_plain(value) for value in row])
+        return
+    for row in rows:
+        yield json.dumps(
+            dict(zip(columns, row)), ensure_ascii=False, default=_plain
+        ) + "\n"
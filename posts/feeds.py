@@ -0,0 +1,140 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from yatube.metrics import record_cache
+
+from . import timeline
+from .caching import get_versions, post_view_namespaces
+from .models import Comment, Follow, Group, Post
+from .paginator import COMMENTS_PER_PAGE, CursorPaginator
+
+# Новые комментарии сверху; порядок совпадает с индексом (post, -created, -id).
+COMMENT_ORDERING = ("-created", "-id")
+# Новые подписки сверху; индексы (author, -id) и (user, -id).
+FOLLOW_ORDERING = ("-id",)
+
+
+def get_group(slug):
+    """Группа по slug из кеша.
+
+    В ключе версия «groups», которую меняет сохранение и удаление любой
+    группы, так что устаревшая запись просто перестаёт читаться.
+    """
+    version, = get_versions(["groups"])
+    key = f"group:{slug}:{version!r}"
+    group = cache.get(key)
+    record_cache("group", group is not None, group is None)
+    if group is None:
+        group = Group.objects.filter(slug=slug).first()
+        if group is None:
+            raise Http404("Нет такой группы")
+        cache.set(key, group, settings.PAGE_CACHE_TIMEOUT)
+    return group
+
+
+def index_feed():
+    return Post.objects.for_feed()
+
+
+def group_feed(group):
+    return Post.objects.for_feed().filter(group=group)
+
+
+def profile_feed(author):
+    return Post.objects.for_feed().filter(author=author)
+
+
+def follow_feed(user):
+    return timeline.posts_for(user).for_feed()
+
+
+def followers_feed(author):
+    """Подписки на ``author`` вместе с подписчиками, одним запросом."""
+    return Follow.objects.filter(author=author).select_related("user")
+
+
+def following_feed(user):
+    """Подписки ``user`` вместе с авторами, одним запросом."""
+    return Follow.objects.filter(user=user).select_related("author")
+
+
+def mark_followed(viewer, users):
+    """Проставляет ``users`` флаг ``is_followed``: подписан ли ``viewer``.
+
+    Один запрос на всю страницу; у анонима флаг None.
+    """
+    followed = None
+    if viewer.is_authenticated and users:
+        followed = set(Follow.objects.filter(
+            user=viewer, author__in=[user.pk for user in users]
+        ).values_list("author_id", flat=True))
+    for user in users:
+        user.is_followed = None if followed is None else user.pk in followed
+    return users
+
+
+def comment_feed(post):
+    return Comment.objects.filter(post=post).select_related("author")
+
+
+def get_post(username, post_id, **annotations):
+    """Пост вместе с автором, его счётчиками и группой — один запрос."""
+    return get_object_or_404(
+        Post.objects.for_feed().select_related("author__stats").annotate(
+            **annotations
+        ),
+        author__username=username,
+        id=post_id,
+    )
+
+
+def comment_pages(post):
+    return CursorPaginator(
+        comment_feed(post), COMMENTS_PER_PAGE, COMMENT_ORDERING
+    )
+
+
+def post_detail(request, username, post_id, cursor=None):
+    """Пост и страница его комментариев: из кеша или за два запроса.
+
+    Первая страница кешируется вместе с постом под версиями страницы
+    поста: правка поста, новый комментарий и подписка на автора меняют
+    версию его профиля, и запись перестаёт читаться. Её ``object_list`` —
+    вычисленный QuerySet: pickle сохраняет его вместе с результатом, и из
+    кеша он приходит без запросов.
+    """
+    if cursor:
+        post = get_post(username, post_id)
+        return post, comment_pages(post).get_page(cursor)
+    versions = get_versions(post_view_namespaces(request, username, post_id))
+    # username берётся прямо из URL: хешируем, чтобы ключ годился для
+    # memcached при любом адресе.
+    raw = "|".join([str(post_id), username, *map(repr, versions)])
+    key = "post_detail:" + hashlib.md5(raw.encode()).hexdigest()
+    cached = cache.get(key)
+    record_cache("post_detail", cached is not None, cached is None)
+    if cached is None:
+        # Как CursorPaginator, берём на строку больше страницы, но эту
+        # строку — тем же запросом, что и пост: есть она — есть и
+        # следующая страница.
+        post = get_post(username, post_id, next_comment=Subquery(
+            Comment.objects.filter(post=OuterRef("pk")).order_by(
+                *COMMENT_ORDERING
+            ).values("pk")[COMMENTS_PER_PAGE:COMMENTS_PER_PAGE + 1]
+        ))
+        comments = comment_feed(post).order_by(
+            *COMMENT_ORDERING
+        )[:COMMENTS_PER_PAGE]
+        rows = list(comments)
+        next_cursor = None
+        if post.next_comment is not None:
+            next_cursor = comment_pages(post).cursor_after(rows[-1])
+        cached = (post, comments, next_cursor)
+        cache.set(key, cached, settings.PAGE_CACHE_TIMEOUT)
+    post, comments, next_cursor = cached
+    return post, comment_pages(post).make_page(comments, 1, next_cursor, None)
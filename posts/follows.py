@@ -0,0 +1,110 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from . import counters, timeline
+from .caching import bump
+from .models import Follow, UserStats
+
+_local = threading.local()
+
+
+def signals_muted():
+    """True, пока unfollow() сам ведёт учёт подписок, которые удаляет."""
+    return getattr(_local, "muted", False)
+
+
+@contextmanager
+def _mute_signals():
+    _local.muted = True
+    try:
+        yield
+    finally:
+        _local.muted = False
+
+
+def followed(user, authors):
+    """Учёт новых подписок ``user`` на ``authors``: счётчики, лента, кеш.
+
+    Единственное место такого учёта: его зовут и follow(), и сигнал
+    post_save у Follow.
+    """
+    author_ids = [author.pk for author in authors]
+    counters.change_follow_counters(user.pk, author_ids, 1)
+    timeline.backfill(user.pk, *author_ids)
+    _bump(user, authors)
+
+
+def unfollowed(user, authors):
+    """Учёт снятых подписок; пара к followed()."""
+    author_ids = [author.pk for author in authors]
+    counters.change_follow_counters(user.pk, author_ids, -1)
+    timeline.remove(user.pk, *author_ids)
+    timeline.refill_demoted(*author_ids)
+    _bump(user, authors)
+
+
+def _bump(user, authors):
+    bump(f"profile:{user.username}", f"follow:{user.pk}",
+         *(f"profile:{author.username}" for author in authors))
+
+
+def _lock(user):
+    # Подписки одного пользователя меняются по очереди: строка его
+    # статистики блокируется до конца транзакции, и второй одновременный
+    # запрос видит уже итог первого. SQLite FOR UPDATE не умеет, но и
+    # двух пишущих транзакций сразу не допускает.
+    list(UserStats.objects.select_for_update().filter(
+        user=user
+    ).values_list("pk", flat=True))
+
+
+@transaction.atomic
+def follow(user, authors):
+    """Подписывает ``user`` на ``authors``; возвращает число новых подписок.
+
+    Под блокировкой пользователя (_lock) выбираются подписки, которых ещё
+    нет, и вставляются одним INSERT. Ограничение user_author вдобавок
+    отбрасывает дубликаты, пришедшие в обход этой функции. bulk_create не
+    шлёт сигналов, поэтому учёт ведёт followed().
+    """
+    authors = {author.pk: author for author in authors
+               if author.pk != user.pk}
+    if not authors:
+        return 0
+    _lock(user)
+    existing = set(Follow.objects.filter(
+        user=user, author_id__in=authors
+    ).values_list("author_id", flat=True))
+    new = [author for pk, author in authors.items() if pk not in existing]
+    if not new:
+        return 0
+    Follow.objects.bulk_create(
+        (Follow(user=user, author=author) for author in new),
+        ignore_conflicts=True,
+    )
+    followed(user, new)
+    return len(new)
+
+
+@transaction.atomic
+def unfollow(user, authors):
+    """Отписывает ``user`` от ``authors``; возвращает число снятых подписок.
+
+    Подписки удаляются одним delete() под той же блокировкой, что и в
+    follow(); сигналы post_delete на это время заглушены, и учёт всей
+    пачки разом ведёт unfollowed().
+    """
+    _lock(user)
+    relations = list(Follow.objects.filter(
+        user=user, author_id__in=[author.pk for author in authors]
+    ).select_related("author"))
+    if not relations:
+        return 0
+    with _mute_signals():
+        Follow.objects.filter(
+            pk__in=[relation.pk for relation in relations]
+        ).delete()
+    unfollowed(user, [relation.author for relation in relations])
+    return len(relations)
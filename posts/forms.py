@@ -1,5 +1,8 @@
 from django import forms
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
 from .models import Post, Comment
+from .uploads import RejectedUpload, shrink
 from django.db import models
 
 
@@ -22,6 +25,31 @@ class PostForm(forms.ModelForm):
             "image": "Загрузите изображение",
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Отклонённый по размеру файл убираем до разбора картинки, иначе
+        # вместо понятной ошибки будет «файл повреждён».
+        image = self.files.get("image")
+        self.rejected_image = None
+        if isinstance(image, RejectedUpload):
+            self.rejected_image = image
+            self.files = self.files.copy()
+            del self.files["image"]
+
+    def clean_image(self):
+        image = self.cleaned_data.get("image")
+        if self.rejected_image is not None:
+            raise forms.ValidationError(
+                "Файл слишком большой: допустимо не больше %(limit)s.",
+                code="file_too_large",
+                params={"limit": filesizeformat(
+                    settings.POST_IMAGE_MAX_UPLOAD_SIZE
+                )},
+            )
+        if getattr(image, "image", None) is not None:
+            image = shrink(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
 
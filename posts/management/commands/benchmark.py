@@ -0,0 +1,88 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import urls
+from posts.benchmark import Benchmark, compare, load_baseline, save_baseline
+from posts.models import Group, Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Гоняет запросы по всем адресам приложения posts и печатает "
+        "p50/p95/p99, число запросов к базе и пропускную способность. "
+        "База не меняется: всё откатывается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names", nargs="*",
+            help="Имена адресов из posts/urls.py; по умолчанию все.",
+        )
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--seed", type=int)
+        parser.add_argument(
+            "--baseline",
+            help="JSON с прошлым замером: сравнить и упасть при регрессии.",
+        )
+        parser.add_argument(
+            "--save",
+            help="Сохранить результат как новый baseline.",
+        )
+        parser.add_argument(
+            "--tolerance", type=float, default=0.2,
+            help="Допустимый рост p95 относительно baseline (доля).",
+        )
+
+    def handle(self, *args, **options):
+        if not (Post.objects.exists() and Group.objects.exists()):
+            raise CommandError(
+                "Нужны посты и группы: сначала запустите seed."
+            )
+        if options["requests"] < 1:
+            raise CommandError("--requests должен быть положительным.")
+        unknown = set(options["names"]) - {
+            pattern.name for pattern in urls.urlpatterns
+        }
+        if unknown:
+            raise CommandError(
+                f"Нет таких адресов: {', '.join(sorted(unknown))}"
+            )
+        benchmark = Benchmark(
+            requests=options["requests"],
+            warmup=options["warmup"],
+            names=options["names"],
+            seed=options["seed"],
+        )
+        results = benchmark.run()
+        self.stdout.write(
+            f"{'адрес':<18}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}"
+            f"{'запросы':>9}{'rps':>8}{'ошибки':>8}"
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<18}{row['requests']:>6}{row['p50']:>9.1f}"
+                f"{row['p95']:>9.1f}{row['p99']:>9.1f}{row['queries']:>9.1f}"
+                f"{row['rps']:>8.0f}{row['errors']:>8}"
+            )
+        total = sum(row["requests"] for row in results.values())
+        elapsed = sum(row["requests"] / row["rps"] for row in results.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Всего запросов: {total} за {elapsed:.1f} с "
+            f"({total / elapsed:.0f} запросов/с в один поток)"
+        ))
+        if options["save"]:
+            save_baseline(results, options["save"])
+            self.stdout.write(f"Baseline сохранён в {options['save']}")
+        if options["baseline"] and os.path.exists(options["baseline"]):
+            regressions = compare(
+                results, load_baseline(options["baseline"]),
+                options["tolerance"],
+            )
+            if regressions:
+                raise CommandError(
+                    "Регрессии относительно baseline:\n"
+                    + "\n".join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS("Регрессий нет"))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from posts.bulk import BulkLoader, open_dump, rebuild_derived
+
+
+class Command(BaseCommand):
+    help = (
+        "Быстро загружает дамп dumpdata (JSON-массив, можно .gz): "
+        "пользователей, группы, посты, комментарии и подписки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--ignore-conflicts", action="store_true",
+            help="Пропускать строки, которые уже есть в базе.",
+        )
+        parser.add_argument(
+            "--skip-derived", action="store_true",
+            help="Не пересчитывать счётчики, ленты и поисковый индекс.",
+        )
+
+    def handle(self, *args, **options):
+        loader = BulkLoader(
+            batch_size=options["batch_size"],
+            ignore_conflicts=options["ignore_conflicts"],
+        )
+        with open_dump(options["path"]) as stream:
+            elapsed = loader.load(stream)
+        total = sum(loader.loaded.values())
+        for model, count in loader.loaded.items():
+            self.stdout.write(f"{model._meta.label}: {count}")
+        self.stdout.write(
+            f"Пропущено объектов других моделей: {loader.skipped}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Загружено строк: {total} за {elapsed:.1f} с "
+            f"({total / max(elapsed, 1e-6):.0f} строк/с)"
+        ))
+        if options["skip_derived"]:
+            return
+        rebuild_derived()
+        self.stdout.write(self.style.SUCCESS(
+            "Счётчики, ленты и поисковый индекс пересобраны"
+        ))
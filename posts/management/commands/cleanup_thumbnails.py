@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from posts.thumbnail_cleanup import ThumbnailCleanup
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет картинки постов и миниатюры, на которые никто не "
+        "ссылается, и устаревшие строки KV-хранилища sorl. Безопасно "
+        "запускать по расписанию (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Только посчитать, ничего не удалять.",
+        )
+        parser.add_argument(
+            "--grace", type=int, default=60 * 60,
+            help="Не трогать файлы моложе стольких секунд.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cleanup = ThumbnailCleanup(
+            dry_run=options["dry_run"],
+            grace=options["grace"],
+            batch_size=options["batch_size"],
+        ).run()
+        verb = "Будет удалено" if options["dry_run"] else "Удалено"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} файлов: {cleanup.files} "
+            f"({filesizeformat(cleanup.bytes)}), "
+            f"строк KV: {cleanup.rows}"
+        ))
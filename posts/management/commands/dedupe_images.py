@@ -0,0 +1,64 @@
+import posixpath
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Now
+from django.template.defaultfilters import filesizeformat
+
+from posts.caching import bump
+from posts.models import Post
+from posts.storage import release
+
+
+class Command(BaseCommand):
+    help = (
+        "Переименовывает картинки постов по содержимому, склеивая "
+        "одинаковые файлы, и удаляет освободившиеся копии."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field("image")
+        storage = field.storage
+        renamed = removed = reclaimed = 0
+        last = ""
+        while True:
+            names = list(Post.objects.filter(image__gt=last).order_by(
+                "image"
+            ).values_list("image", flat=True).distinct()[
+                :options["batch_size"]
+            ])
+            if not names:
+                break
+            last = names[-1]
+            for name in names:
+                try:
+                    if not storage.exists(name):
+                        continue
+                except SuspiciousFileOperation:
+                    # Путь вне MEDIA_ROOT — не наш файл.
+                    continue
+                upload_name = posixpath.join(
+                    field.upload_to, posixpath.basename(name)
+                )
+                with storage.open(name) as content:
+                    if storage.content_name(upload_name, content) == name:
+                        continue
+                    new_name = storage.save(upload_name, content)
+                Post.objects.filter(image=name).update(
+                    image=new_name, modified=Now()
+                )
+                renamed += 1
+                size = storage.size(name)
+                if release(name):
+                    removed += 1
+                    reclaimed += size
+        if renamed:
+            # Поменялись карточки по всему сайту.
+            bump("index", "groups")
+        self.stdout.write(self.style.SUCCESS(
+            f"Переименовано картинок: {renamed}, удалено копий: {removed} "
+            f"({filesizeformat(reclaimed)})"
+        ))
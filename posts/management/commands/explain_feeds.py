@@ -0,0 +1,114 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.seeding import Seeder
+
+MODELS = (Post, Comment, Follow)
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает планы (EXPLAIN) и время запросов лент с составными "
+        "индексами и без них. Всё выполняется в транзакции, которая "
+        "откатывается, так что база не меняется."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", type=int, default=0,
+            help="Сколько постов сгенерировать перед замером.",
+        )
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        if not connection.features.can_rollback_ddl:
+            raise CommandError(
+                "База не умеет откатывать DDL, замер без индексов невозможен."
+            )
+        self.repeat = options["repeat"]
+        with transaction.atomic():
+            if options["seed"]:
+                self.seed(options["seed"], options["users"])
+            self.analyze()
+            after = self.measure("С индексами")
+            self.drop_indexes()
+            self.analyze()
+            before = self.measure("Без индексов")
+            transaction.set_rollback(True)
+        self.stdout.write("\nИтог, мс (без индексов -> с индексами):")
+        for name in after:
+            self.stdout.write(
+                f"  {name:<28} {before[name]:>9.2f} -> {after[name]:>9.2f}"
+            )
+
+    def queries(self):
+        feed = Post.objects.for_feed().order_by("-pub_date", "-id")
+        middle = feed.values("pub_date", "id")[
+            Post.objects.count() // 2:
+        ].first() or {"pub_date": timezone.now(), "id": 0}
+        busy_post = Post.objects.order_by("-comments_count").first()
+        author = User.objects.order_by("-stats__posts_count").first()
+        group = Group.objects.first()
+        follow = Follow.objects.first()
+        return {
+            "index, первая страница": feed[:11],
+            "index, глубокая страница": feed.filter(
+                pub_date__lte=middle["pub_date"]
+            ).exclude(pub_date=middle["pub_date"], id__gte=middle["id"])[:11],
+            "group": feed.filter(group=group)[:11],
+            "profile": feed.filter(author=author)[:11],
+            "comments поста": Comment.objects.filter(
+                post=busy_post
+            ).order_by("-created", "-id")[:11],
+            "follow по (user, author)": Follow.objects.filter(
+                user_id=getattr(follow, "user_id", 0),
+                author_id=getattr(follow, "author_id", 0),
+            ),
+            "подписчики автора": Follow.objects.filter(
+                author=author
+            ).values("user_id")[:50],
+        }
+
+    def measure(self, title):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {title}"))
+        timings = {}
+        for name, queryset in self.queries().items():
+            samples = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[name] = statistics.median(samples)
+            self.stdout.write(f"-- {name}: {timings[name]:.2f} мс")
+            self.stdout.write(queryset.explain())
+        return timings
+
+    def drop_indexes(self):
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model in MODELS:
+                for index in model._meta.indexes:
+                    cursor.execute(str(index.remove_sql(model, editor)))
+
+    def analyze(self):
+        if connection.vendor in ("sqlite", "postgresql"):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def seed(self, posts, users):
+        started = time.perf_counter()
+        Seeder(
+            users=users, posts=posts, comments=posts, follows=10,
+            prefix=f"bench{random.randrange(10 ** 6)}_",
+        ).run()
+        self.stdout.write(
+            f"Сгенерировано {posts} постов за "
+            f"{time.perf_counter() - started:.1f} с"
+        )
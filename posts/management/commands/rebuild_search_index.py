@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.search import rebuild, use_fts
+
+
+class Command(BaseCommand):
+    help = "Заново строит поисковый индекс по постам и комментариям."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild()
+        engine = "FTS5" if use_fts() else "SearchTerm"
+        self.stdout.write(self.style.SUCCESS(f"Индекс ({engine}) пересобран"))
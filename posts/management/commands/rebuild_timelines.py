@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import User
+from posts.timeline import rebuild
+
+
+class Command(BaseCommand):
+    help = "Заново собирает ленты подписок всех пользователей."
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(follower__isnull=False).distinct()
+        total = 0
+        for user in users.iterator():
+            with transaction.atomic():
+                rebuild(user)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f"Пересобрано лент: {total}"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount_posts, recount_users
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики постов, подписок и комментариев."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = recount_users()
+            posts = recount_posts()
+        self.stdout.write(self.style.SUCCESS(
+            f"Пересчитано пользователей: {users}, постов: {posts}"
+        ))
@@ -0,0 +1,88 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.bulk import rebuild_derived
+from posts.models import User
+from posts.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическими пользователями, группами, постами, "
+        "комментариями, подписками и картинками для нагрузочных замеров."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=20000)
+        parser.add_argument("--comments", type=int, default=20000)
+        parser.add_argument(
+            "--follows", type=int, default=20,
+            help="Среднее число подписок пользователя, кроме звёзд.",
+        )
+        parser.add_argument("--celebrities", type=int, default=10)
+        parser.add_argument(
+            "--celebrity-share", type=float, default=0.3,
+            help="Доля пользователей, подписанных на каждую звезду.",
+        )
+        parser.add_argument(
+            "--zipf", type=float, default=1.1,
+            help="Показатель Ципфа для постов и комментариев.",
+        )
+        parser.add_argument(
+            "--images", type=int, default=0,
+            help="Сколько разных картинок сгенерировать.",
+        )
+        parser.add_argument("--image-share", type=float, default=0.1)
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--prefix", default="seed")
+        parser.add_argument(
+            "--seed", type=int,
+            help="Зерно генератора, чтобы данные повторялись.",
+        )
+        parser.add_argument(
+            "--skip-derived", action="store_true",
+            help="Не пересчитывать счётчики, ленты и поисковый индекс.",
+        )
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f"Пользователи с префиксом {prefix!r} уже есть, "
+                "укажите другой --prefix."
+            )
+        seeder = Seeder(
+            users=options["users"],
+            groups=options["groups"],
+            posts=options["posts"],
+            comments=options["comments"],
+            follows=options["follows"],
+            celebrities=options["celebrities"],
+            celebrity_share=options["celebrity_share"],
+            zipf=options["zipf"],
+            images=options["images"],
+            image_share=options["image_share"],
+            days=options["days"],
+            prefix=prefix,
+            seed=options["seed"],
+        )
+        started = time.perf_counter()
+        with transaction.atomic():
+            created = seeder.run()
+        for label, count in created.items():
+            self.stdout.write(f"{label}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Сгенерировано за {time.perf_counter() - started:.1f} с"
+        ))
+        if options["skip_derived"]:
+            return
+        started = time.perf_counter()
+        rebuild_derived()
+        self.stdout.write(self.style.SUCCESS(
+            "Счётчики, ленты и поисковый индекс пересобраны за "
+            f"{time.perf_counter() - started:.1f} с"
+        ))
@@ -0,0 +1,81 @@
+import gzip
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from posts.export import EXPORTS, FORMATS, lines, rows
+
+
+def parse_since(value):
+    try:
+        moment = parse_datetime(value) or parse_date(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise CommandError(f"Не удалось разобрать дату: {value}")
+    if not isinstance(moment, datetime):
+        moment = datetime.combine(moment, datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = (
+        "Построчно выгружает посты, комментарии или подписки в JSONL или "
+        "CSV, не держа таблицу в памяти."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=sorted(EXPORTS))
+        parser.add_argument("--format", choices=FORMATS, default="jsonl")
+        parser.add_argument(
+            "-o", "--output",
+            help="Файл выгрузки; по умолчанию stdout.",
+        )
+        parser.add_argument(
+            "--gzip", action="store_true",
+            help="Сжать выгрузку (включается сам для имён на .gz).",
+        )
+        parser.add_argument(
+            "--since",
+            help="Только записи с датой не раньше этой (подписки — все).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        compress = options["gzip"] or bool(path and path.endswith(".gz"))
+        if compress and not path:
+            raise CommandError("Для --gzip нужен --output.")
+        since = options["since"] and parse_since(options["since"])
+        started = time.perf_counter()
+        if path is None:
+            count = self.write(self.stdout, options, since)
+            report = self.stderr
+        else:
+            opener = gzip.open if compress else open
+            with opener(path, "wt", encoding="utf-8", newline="") as stream:
+                count = self.write(stream, options, since)
+            report = self.stdout
+        elapsed = time.perf_counter() - started
+        report.write(self.style.SUCCESS(
+            f"Выгружено строк: {count} за {elapsed:.1f} с"
+        ))
+
+    def write(self, stream, options, since):
+        count = 0
+        for line in lines(
+            options["model"],
+            rows(options["model"], since=since,
+                 chunk_size=options["chunk_size"]),
+            options["format"],
+        ):
+            stream.write(line)
+            count += 1
+        if options["format"] == "csv":
+            count -= 1
+        return count
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    readers = Follow.objects.values_list('user_id', flat=True).distinct()
+    for user_id in readers.iterator():
+        authors = Follow.objects.filter(user_id=user_id).values('author')
+        posts = Post.objects.filter(author__in=authors).order_by(
+            '-pub_date', '-id'
+        ).values_list('pk', 'author_id', 'pub_date')[:settings.TIMELINE_LENGTH]
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user_id=user_id, post_id=pk, author_id=author_id,
+                          pub_date=pub_date)
+            for pk, author_id, pub_date in posts
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='posts_timel_user_id_b48120_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='timeline_user_post'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
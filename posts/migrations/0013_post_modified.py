@@ -0,0 +1,25 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:49
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_pub_date(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(modified=F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_pub_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:53
+
+from django.db import OperationalError, migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 есть только у SQLite; на остальных базах поиск работает через
+    # таблицу SearchTerm, которую заполняет rebuild_search_index.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE posts_search USING fts5("
+            "text, comment, post_id UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    except OperationalError:
+        return
+    schema_editor.execute(
+        "INSERT INTO posts_search (posts_search, rank) "
+        "VALUES ('rank', 'bm25(2.0, 1.0)')"
+    )
+    schema_editor.execute(
+        "INSERT INTO posts_search (rowid, text, comment, post_id) "
+        "SELECT id * 2, text, '', id FROM posts_post"
+    )
+    schema_editor.execute(
+        "INSERT INTO posts_search (rowid, text, comment, post_id) "
+        "SELECT id * 2 + 1, '', text, post_id FROM posts_comment"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS posts_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Comment')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'post'], name='posts_searc_term_27a9f7_idx'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
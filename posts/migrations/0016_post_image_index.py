@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='posts/'),
+        ),
+    ]
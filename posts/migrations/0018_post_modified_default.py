@@ -0,0 +1,19 @@
+# Generated by Django 2.2.6 on 2026-10-18 06:07
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='modified',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.6 on 2026-10-18 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_modified_default'),
+    ]
+
+    operations = [
+        # (author, user) не нужен: по автору ищет (author, -id), пару —
+        # уникальный индекс user_author.
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='posts_follo_author__a4218d_idx',
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', '-id'], name='posts_follo_author__59acdf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['user', '-id'], name='posts_follo_user_id_9a7c72_idx'),
+        ),
+    ]
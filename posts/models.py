@@ -1,10 +1,19 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django import forms
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Всё, что нужно карточке поста, одним запросом."""
+        return self.select_related("author", "group")
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=100, unique=True)
@@ -21,14 +30,32 @@ class Post(models.Model):
                                related_name="posts")
     group = models.ForeignKey(Group, blank=True, null=True, 
                               on_delete=models.SET_NULL, related_name="posts")
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
-    
+    image = models.ImageField(
+        upload_to='posts/', blank=True, null=True, db_index=True,
+        storage=ContentAddressedStorage(),
+    )
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
+    # Не auto_now: loaddata сохраняет без pre_save, и старым фикстурам
+    # без этого поля нужно значение по умолчанию.
+    modified = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
     def __str__(self):
         return self.text
+
+    def save(self, *args, **kwargs):
+        self.modified = timezone.now()
+        super().save(*args, **kwargs)
     
 
     class Meta:
         ordering = ("-pub_date",)
+        indexes = (
+            models.Index(fields=['-pub_date', '-id']),
+            models.Index(fields=['author', '-pub_date', '-id']),
+            models.Index(fields=['group', '-pub_date', '-id']),
+        )
 
 
 class Comment(models.Model):
@@ -43,6 +70,7 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ("-created", )
+        indexes = (models.Index(fields=['post', '-created', '-id']),)
 
 
 class Follow(models.Model):
@@ -57,4 +85,54 @@ class Follow(models.Model):
                        fields=['user', 'author'], 
                        name='user_author'
                        ),
-                    )
\ No newline at end of file
+                    )
+        indexes = (
+            # Списки подписчиков и подписок листаются по -id; поиск пары
+            # (user, author) покрывает уникальный индекс user_author.
+            models.Index(fields=['author', '-id']),
+            models.Index(fields=['user', '-id']),
+        )
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name="stats")
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="timeline_entries")
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name="+")
+    pub_date = models.DateTimeField()
+
+
+    class Meta:
+        constraints = (models.UniqueConstraint(
+                       fields=['user', 'post'],
+                       name='timeline_user_post'
+                       ),
+                    )
+        indexes = (models.Index(fields=['user', '-pub_date']),)
+
+
+class SearchTerm(models.Model):
+    """Обратный индекс для баз без встроенного полнотекстового поиска."""
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="+")
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE,
+                                blank=True, null=True, related_name="+")
+    weight = models.PositiveIntegerField(default=1)
+
+
+    class Meta:
+        indexes = (models.Index(fields=['term', 'post']),)
@@ -0,0 +1,159 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+USERS_PER_PAGE = 30
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу сортировки (keyset) вместо OFFSET.
+
+    Курсор — непрозрачная строка с значениями полей сортировки последней
+    (или первой) записи страницы, поэтому любая страница стоит как первая.
+    Возвращаемая страница — обычный ``Page``, у которого дополнительно
+    заполнены ``next_cursor`` и ``previous_cursor``. Номера страниц при
+    этом неизвестны. ``page.paginator`` — обычный ``Paginator`` над тем же
+    queryset: COUNT он делает, только если спросить count или num_pages.
+    """
+
+    def __init__(self, object_list, per_page, ordering=("-pub_date", "-id")):
+        self.object_list = object_list.order_by(*ordering)
+        self.per_page = per_page
+        self.ordering = ordering
+        self.fields = [name.lstrip("-") for name in ordering]
+        self.paginator = Paginator(self.object_list, per_page)
+
+    def get_page(self, cursor=None, page_number=None):
+        position = self.decode(cursor)
+        if position is None and page_number not in (None, "", "1"):
+            return self._legacy_page(page_number)
+        direction, values = position or ("n", None)
+        if direction == "p":
+            return self._previous_page(values)
+        return self._next_page(values)
+
+    def encode(self, direction, values):
+        raw = json.dumps([direction, values], default=str)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode(self, cursor):
+        if not cursor:
+            return None
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            direction, values = json.loads(
+                base64.urlsafe_b64decode(padded.encode()).decode()
+            )
+            if direction not in ("n", "p") or len(values) != len(self.fields):
+                return None
+            model = self.object_list.model
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            return None
+        return direction, values
+
+    def cursor_after(self, obj):
+        """Курсор страницы, которая идёт сразу за ``obj``."""
+        return self.encode("n", self._position(obj))
+
+    def _position(self, obj):
+        return [getattr(obj, name) for name in self.fields]
+
+    def _keyset(self, values, backwards=False):
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            field = name.lstrip("-")
+            descending = name.startswith("-") != backwards
+            lookup = "lt" if descending else "gt"
+            step = Q(**{f"{field}__{lookup}": values[index]})
+            for previous, value in zip(self.fields[:index], values):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [
+            name[1:] if name.startswith("-") else f"-{name}"
+            for name in self.ordering
+        ]
+
+    def _next_page(self, values):
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._keyset(values))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        previous_cursor = None
+        if values is not None:
+            anchor = self._position(rows[0]) if rows else values
+            previous_cursor = self.encode("p", anchor)
+        next_cursor = None
+        if has_next:
+            next_cursor = self.cursor_after(rows[-1])
+        return self.make_page(rows, None if values else 1,
+                              next_cursor, previous_cursor)
+
+    def _previous_page(self, values):
+        queryset = self.object_list.filter(
+            self._keyset(values, backwards=True)
+        ).order_by(*self._reversed_ordering())
+        rows = list(queryset[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        previous_cursor = None
+        if has_previous:
+            previous_cursor = self.encode("p", self._position(rows[0]))
+        next_cursor = self.encode(
+            "n", self._position(rows[-1]) if rows else values
+        )
+        return self.make_page(rows, None if has_previous else 1,
+                              next_cursor, previous_cursor)
+
+    def _legacy_page(self, page_number):
+        # Старые ссылки вида ?page=N: один раз отрабатываем через OFFSET,
+        # дальше навигация идёт уже по курсорам.
+        page = self.paginator.get_page(page_number)
+        rows = list(page.object_list)
+        next_cursor = previous_cursor = None
+        if rows and page.has_next():
+            next_cursor = self.encode("n", self._position(rows[-1]))
+        if rows and page.has_previous():
+            previous_cursor = self.encode("p", self._position(rows[0]))
+        return self.make_page(rows, page.number, next_cursor, previous_cursor)
+
+    def make_page(self, rows, number, next_cursor, previous_cursor):
+        """Страница из уже выбранных строк (например, взятых из кеша)."""
+        page = Page(rows, number, self.paginator)
+        page.next_cursor = next_cursor
+        page.previous_cursor = previous_cursor
+        return page
+
+
+def paginate(request, object_list, per_page=POSTS_PER_PAGE,
+             ordering=("-pub_date", "-id")):
+    """Страница по курсору из запроса и её ``Paginator`` для шаблона.
+
+    Возвращается не CursorPaginator, а обычный ``Paginator`` страницы
+    (см. CursorPaginator): шаблоны работают с ним как раньше.
+    """
+    paginator = CursorPaginator(object_list, per_page, ordering)
+    page = paginator.get_page(
+        request.GET.get("cursor"), request.GET.get("page")
+    )
+    return page.paginator, page
+
+
+def paginate_numbered(request, object_list, per_page=POSTS_PER_PAGE):
+    """Обычная постраничность по ?page=N для того, что не queryset."""
+    paginator = Paginator(object_list, per_page)
+    return paginator, paginator.get_page(request.GET.get("page"))
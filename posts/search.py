@@ -0,0 +1,187 @@
+import re
+from collections import Counter
+
+from django.db import connection
+from django.db.models import BooleanField, Count, Sum
+from django.db.models.expressions import RawSQL
+
+from .models import Comment, Post, SearchTerm
+
+FTS_TABLE = "posts_search"
+WORD = re.compile(r"\w+")
+# Совпадение в тексте поста весит больше, чем в комментарии.
+POST_WEIGHT = 2
+
+_fts_enabled = None
+
+
+def tokenize(text):
+    return [word[:64] for word in WORD.findall(text.lower())]
+
+
+def use_fts():
+    """На SQLite поиск идёт через FTS5, иначе через таблицу SearchTerm."""
+    global _fts_enabled
+    if _fts_enabled is None:
+        _fts_enabled = (
+            connection.vendor == "sqlite"
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_enabled
+
+
+def _fts_rowid(obj):
+    # Посты и комментарии живут в одной таблице: чётные rowid — посты.
+    return obj.pk * 2 + (1 if isinstance(obj, Comment) else 0)
+
+
+def _fts_write(obj, text, comment, post_id):
+    rowid = _fts_rowid(obj)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [rowid])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, text, comment, post_id) "
+            f"VALUES (%s, %s, %s, %s)",
+            [rowid, text, comment, post_id],
+        )
+
+
+def _terms_write(post_id, comment_id, text, weight):
+    SearchTerm.objects.filter(post_id=post_id, comment_id=comment_id).delete()
+    SearchTerm.objects.bulk_create(
+        SearchTerm(term=term, post_id=post_id, comment_id=comment_id,
+                   weight=count * weight)
+        for term, count in Counter(tokenize(text)).items()
+    )
+
+
+def index_post(post):
+    if use_fts():
+        _fts_write(post, post.text, "", post.pk)
+    else:
+        _terms_write(post.pk, None, post.text, POST_WEIGHT)
+
+
+def index_comment(comment):
+    if use_fts():
+        _fts_write(comment, "", comment.text, comment.post_id)
+    else:
+        _terms_write(comment.post_id, comment.pk, comment.text, 1)
+
+
+def remove(*objs):
+    # Строки SearchTerm удаляются каскадом вместе с постом/комментарием.
+    if use_fts() and objs:
+        rowids = [_fts_rowid(obj) for obj in objs]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+                f"({', '.join(['%s'] * len(rowids))})",
+                rowids,
+            )
+
+
+def rebuild():
+    if use_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, text, comment, post_id) "
+                f"SELECT id * 2, text, '', id FROM posts_post"
+            )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, text, comment, post_id) "
+                f"SELECT id * 2 + 1, '', text, post_id FROM posts_comment"
+            )
+        return
+    SearchTerm.objects.all().delete()
+    for post in Post.objects.only("text").iterator(chunk_size=1000):
+        index_post(post)
+    for comment in Comment.objects.only(
+        "text", "post_id"
+    ).iterator(chunk_size=1000):
+        index_comment(comment)
+
+
+class SearchResults:
+    """Ленивая выдача поиска, которую можно отдать в Paginator.
+
+    Пост находится, если все слова запроса встречаются в его тексте или
+    в одном из комментариев; сортировка по релевантности (bm25 в FTS5,
+    сумма весов слов в SearchTerm).
+    """
+
+    def __init__(self, query):
+        self.terms = list(dict.fromkeys(tokenize(query)))
+
+    def _match(self):
+        return " ".join(f'"{term}"' for term in self.terms)
+
+    def _terms_queryset(self):
+        return SearchTerm.objects.filter(term__in=self.terms).values(
+            "post"
+        ).annotate(
+            matched=Count("term", distinct=True), score=Sum("weight")
+        ).filter(matched=len(self.terms))
+
+    def count(self):
+        if not self.terms:
+            return 0
+        if not use_fts():
+            return self._terms_queryset().count()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(DISTINCT post_id) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s",
+                [self._match()],
+            )
+            return cursor.fetchone()[0]
+
+    def filter_posts(self, queryset):
+        """Оставляет в ``queryset`` постов все найденные, без лимита.
+
+        Сортировка по релевантности тут не нужна: например, админка
+        сортирует по-своему и считает строки сама.
+        """
+        if not self.terms:
+            return queryset.none()
+        if not use_fts():
+            return queryset.filter(
+                pk__in=self._terms_queryset().values("post")
+            )
+        # RawSQL под pk__in Django 2.2 берёт в лишние скобки, и подзапрос
+        # становится скалярным; поэтому условие — аннотация, как с Exists.
+        table = connection.ops.quote_name(queryset.model._meta.db_table)
+        return queryset.annotate(search_match=RawSQL(
+            f"{table}.id IN (SELECT post_id FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s)",
+            [self._match()],
+            output_field=BooleanField(),
+        )).filter(search_match=True)
+
+    def post_ids(self, offset, limit):
+        if not self.terms:
+            return []
+        if not use_fts():
+            return list(self._terms_queryset().order_by(
+                "-score", "-post"
+            ).values_list("post", flat=True)[offset:offset + limit])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT post_id, MIN(rank) AS score FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s GROUP BY post_id "
+                f"ORDER BY score, post_id DESC LIMIT %s OFFSET %s",
+                [self._match(), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        offset = key.start or 0
+        ids = self.post_ids(offset, key.stop - offset)
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
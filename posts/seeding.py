@@ -0,0 +1,193 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image
+
+from .bulk import raw_dates
+from .models import Comment, Follow, Group, Post, User
+
+WORDS = (
+    "кеш индекс лента подписка автор пост группа комментарий запрос база "
+    "страница сервер ответ время память диск сеть очередь воркер картинка "
+    "миниатюра поиск счётчик профиль ключ версия транзакция пачка строка "
+    "таблица план замер нагрузка задержка поток процесс файл каталог "
+    "сегодня вчера снова быстро медленно почему хорошо плохо очень всё"
+).split()
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса 1/rank**s для random.choices(cum_weights=...)."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+class Seeder:
+    """Генератор правдоподобных данных для замеров.
+
+    Число постов у авторов и популярность постов распределены по Ципфу:
+    немногие пишут и собирают комментарии за всех. Первые ``celebrities``
+    авторов — «звёзды», на каждую подписана доля ``celebrity_share``
+    пользователей; прочие подписки тоже чаще ведут к активным авторам.
+    Даты постов растут вместе с pk, комментарии моложе своих постов.
+    Всё пишется пачками bulk_create без сигналов, так что счётчики, ленты
+    и поиск потом надо пересобрать (bulk.rebuild_derived).
+    """
+
+    def __init__(self, users=1000, groups=20, posts=20000, comments=20000,
+                 follows=20, celebrities=10, celebrity_share=0.3,
+                 zipf=1.1, images=0, image_share=0.1, days=365,
+                 prefix="seed", seed=None, batch_size=5000):
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.comments = comments
+        self.follows = follows
+        self.celebrities = min(celebrities, users)
+        self.celebrity_share = celebrity_share
+        self.zipf = zipf
+        self.images = images
+        self.image_share = image_share
+        self.days = days
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.now = timezone.now()
+        self.created = {}
+
+    def run(self):
+        with raw_dates(Post, Comment):
+            user_ids = self.seed_users()
+            group_ids = self.seed_groups()
+            images = self.seed_images()
+            post_ids = self.seed_posts(user_ids, group_ids, images)
+            self.seed_comments(user_ids, post_ids)
+            self.seed_follows(user_ids)
+        return self.created
+
+    def _create(self, model, objects):
+        objects = iter(objects)
+        total = 0
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            model.objects.bulk_create(batch)
+            total += len(batch)
+        self.created[model._meta.label] = total
+
+    def _new_ids(self, model, objects):
+        # bulk_create на SQLite не возвращает pk: берём всё, что новее.
+        last = model.objects.order_by("-pk").values_list(
+            "pk", flat=True
+        ).first() or 0
+        self._create(model, objects)
+        return list(model.objects.filter(pk__gt=last).order_by(
+            "pk"
+        ).values_list("pk", flat=True))
+
+    def _text(self, low, high):
+        words = self.random.choices(WORDS, k=self.random.randint(low, high))
+        return " ".join(words).capitalize() + "."
+
+    def seed_users(self):
+        user_ids = self._new_ids(User, (
+            User(username=f"{self.prefix}{number}", password="!",
+                 first_name=self.prefix, last_name=str(number))
+            for number in range(self.users)
+        ))
+        # Порядок в списке — ранг по Ципфу: первые пишут больше всех.
+        self.random.shuffle(user_ids)
+        return user_ids
+
+    def seed_groups(self):
+        return self._new_ids(Group, (
+            Group(title=f"{self.prefix} {number}",
+                  slug=f"{self.prefix}-{number}",
+                  description=self._text(5, 20))
+            for number in range(self.groups)
+        ))
+
+    def seed_images(self):
+        storage = Post._meta.get_field("image").storage
+        names = []
+        for _ in range(self.images):
+            image = Image.new("RGB", (1280, 720), tuple(
+                self.random.randrange(256) for _ in range(3)
+            ))
+            content = BytesIO()
+            image.save(content, "JPEG", quality=85)
+            names.append(storage.save(
+                "posts/seed.jpg", ContentFile(content.getvalue())
+            ))
+        return names
+
+    def _pub_date(self, number):
+        step = timedelta(days=self.days) / max(self.posts, 1)
+        return self.now - timedelta(days=self.days) + step * number
+
+    def seed_posts(self, user_ids, group_ids, images):
+        authors = zipf_weights(len(user_ids), self.zipf)
+        groups = group_ids + [None] * len(group_ids)
+
+        def posts():
+            for number in range(self.posts):
+                yield Post(
+                    text=self._text(5, 60),
+                    author_id=self.random.choices(
+                        user_ids, cum_weights=authors
+                    )[0],
+                    group_id=self.random.choice(groups) if groups else None,
+                    image=(
+                        self.random.choice(images)
+                        if images and self.random.random() < self.image_share
+                        else ""
+                    ),
+                    pub_date=self._pub_date(number),
+                )
+        return self._new_ids(Post, posts())
+
+    def seed_comments(self, user_ids, post_ids):
+        if not post_ids:
+            return
+        # Популярные посты разбросаны по всей ленте, а не только новые.
+        ranked = list(range(len(post_ids)))
+        self.random.shuffle(ranked)
+        weights = zipf_weights(len(ranked), self.zipf)
+
+        def comments():
+            for _ in range(self.comments):
+                number = self.random.choices(ranked, cum_weights=weights)[0]
+                posted = self._pub_date(number)
+                age = (self.now - posted) * self.random.random()
+                yield Comment(
+                    post_id=post_ids[number],
+                    author_id=self.random.choice(user_ids),
+                    text=self._text(2, 20),
+                    created=posted + age,
+                )
+        self._create(Comment, comments())
+
+    def seed_follows(self, user_ids):
+        authors = zipf_weights(len(user_ids), self.zipf)
+        celebrities = user_ids[:self.celebrities]
+
+        def follows():
+            for user_id in user_ids:
+                following = {
+                    author_id for author_id in celebrities
+                    if self.random.random() < self.celebrity_share
+                }
+                if self.follows:
+                    following.update(self.random.choices(
+                        user_ids, cum_weights=authors,
+                        k=round(self.random.expovariate(1 / self.follows)),
+                    ))
+                following.discard(user_id)
+                for author_id in following:
+                    yield Follow(user_id=user_id, author_id=author_id)
+        self._create(Follow, follows())
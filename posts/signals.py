@@ -0,0 +1,133 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, follows, search, timeline
+from .caching import bump
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .storage import release
+
+
+# При loaddata (raw=True) связанные объекты могут быть ещё не загружены,
+# поэтому обработчики сохранения их пропускают. Производные данные после
+# загрузки фикстур пересчитываются командами recount_stats,
+# rebuild_timelines и rebuild_search_index.
+
+
+# Посты, удаление которых уже идёт, и их удалённые каскадом комментарии.
+# Счётчик, поиск и кеш таких комментариев обновляются один раз вместе с
+# постом, а не по комментарию.
+_deleting = threading.local()
+
+
+def _deleting_posts():
+    if not hasattr(_deleting, "posts"):
+        _deleting.posts = {}
+    return _deleting.posts
+
+
+def post_namespaces(post, extra_group_ids=()):
+    group_ids = {post.group_id, *extra_group_ids} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        "slug", flat=True
+    ) if group_ids else []
+    return [
+        "index",
+        f"profile:{post.author.username}",
+        *(f"group:{slug}" for slug in slugs),
+    ]
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if kwargs.get("raw"):
+        return
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_saved_fields(sender, instance, **kwargs):
+    if kwargs.get("raw"):
+        return
+    instance._saved_group_id = instance._saved_image = None
+    if instance.pk is not None:
+        instance._saved_group_id, instance._saved_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list("group_id", "image").first() or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if kwargs.get("raw"):
+        return
+    if created:
+        counters.change_user_counter(instance.author_id, "posts_count", 1)
+        timeline.fan_out(instance)
+    search.index_post(instance)
+    old_group = getattr(instance, "_saved_group_id", None)
+    bump(*post_namespaces(instance, [old_group]))
+    old_image = getattr(instance, "_saved_image", None)
+    if old_image and old_image != instance.image.name:
+        transaction.on_commit(lambda: release(old_image))
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # pre_delete всех объектов приходит до удаления каскада.
+    _deleting_posts()[instance.pk] = []
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    comments = _deleting_posts().pop(instance.pk, [])
+    counters.change_user_counter(instance.author_id, "posts_count", -1)
+    search.remove(instance, *comments)
+    bump(*post_namespaces(instance))
+    if instance.image:
+        name = instance.image.name
+        transaction.on_commit(lambda: release(name))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if kwargs.get("raw"):
+        return
+    search.index_comment(instance)
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+        bump(*post_namespaces(instance.post))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    pending = _deleting_posts().get(instance.post_id)
+    if pending is not None:
+        pending.append(instance)
+        return
+    counters.change_comments_count(instance.post_id, -1)
+    search.remove(instance)
+    bump(*post_namespaces(instance.post))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if kwargs.get("raw"):
+        return
+    if created:
+        follows.followed(instance.user, [instance.author])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if not follows.signals_muted():
+        follows.unfollowed(instance.user, [instance.author])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump("groups")
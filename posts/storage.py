@@ -0,0 +1,68 @@
+import hashlib
+import os
+import posixpath
+import time
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+# Файл, который только что переиспользовали или загрузили, не удаляем
+# сразу: на него может ссылаться ещё не закоммиченный пост. Такие файлы
+# потом подбирает cleanup_thumbnails.
+RELEASE_GRACE = 60
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище картинок постов, где имя файла — sha256 содержимого.
+
+    Одинаковые байты попадают в один файл (и одну пачку миниатюр),
+    каталог из upload_to сохраняется: ``posts/ab/<sha256>.jpg``.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = posixpath.dirname(name.replace("\\", "/"))
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Отмечаем переиспользование, чтобы release() его не удалил.
+            os.utime(self.path(name))
+            return name
+        return self._save(name, content)
+
+
+def release(name):
+    """Удалить картинку с миниатюрами, если на неё не ссылается ни один пост.
+
+    Счётчиком ссылок служит сам индекс по Post.image.
+    """
+    from .models import Post
+
+    if not name or Post.objects.filter(image=name).exists():
+        return False
+    storage = Post._meta.get_field("image").storage
+    try:
+        modified = storage.get_modified_time(name).timestamp()
+    except (OSError, SuspiciousFileOperation):
+        # Файла нет или он вообще вне хранилища: удалять нечего.
+        return False
+    if time.time() - modified < RELEASE_GRACE:
+        return False
+    default.kvstore.delete(ImageFile(name, storage))
+    storage.delete(name)
+    return True
@@ -0,0 +1,52 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.caching import get_versions
+from posts.models import Post
+from yatube.metrics import record_cache
+
+register = template.Library()
+
+EDIT_LINK_MARKER = "<!--post-edit-link-->"
+
+
+def card_key(post, groups_version):
+    return (
+        f"post_card:{post.pk}:{post.modified.timestamp()}:{groups_version!r}"
+    )
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Карточки постов из кеша; недостающие рендерятся и докладываются.
+
+    Общая для всех часть карточки кешируется целиком, ссылка
+    «Редактировать» подставляется для каждого зрителя отдельно.
+    """
+    if isinstance(posts, Post):
+        posts = [posts]
+    posts = list(posts)
+    groups_version, = get_versions(["groups"])
+    keys = [card_key(post, groups_version) for post in posts]
+    cards = cache.get_many(keys)
+    record_cache("post_card", len(cards), len(keys) - len(cards))
+    missing = {}
+    user = context.get("user")
+    viewer_id = user.pk if user is not None else None
+    html = []
+    for post, key in zip(posts, keys):
+        card = cards.get(key)
+        if card is None:
+            card = missing[key] = render_to_string(
+                "post_item.html", {"post": post}
+            )
+        edit_link = ""
+        if viewer_id is not None and viewer_id == post.author_id:
+            edit_link = render_to_string("post_edit_link.html", {"post": post})
+        html.append(card.replace(EDIT_LINK_MARKER, edit_link))
+    if missing:
+        cache.set_many(missing, settings.PAGE_CACHE_TIMEOUT)
+    return mark_safe("".join(html))
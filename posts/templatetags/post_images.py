@@ -0,0 +1,16 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag("post_image.html")
+def post_image(post):
+    """<picture> с готовыми нарезками или заглушка того же размера."""
+    return {
+        "post": post,
+        "image": thumbnails.ready(post),
+        "size": settings.POST_IMAGE_SIZE,
+    }
@@ -1,12 +1,35 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import warnings
+from io import BytesIO, StringIO
+
 from django.test import TestCase, override_settings
 from django.test import Client
-from .models import User, Post, Group, Comment, Follow
+from .models import (User, Post, Group, Comment, Follow, UserStats,
+                     TimelineEntry)
 from .forms import PostForm
-from . import views
+from . import follows, search, thumbnails, urls, views
+from .benchmark import Benchmark
+from .bulk import iter_json_array
+from .caching import bump
+from .storage import release
 from django.urls import reverse
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import connection
+from django.db.models import F, QuerySet
+from django.test.utils import CaptureQueriesContext
 from django.core.files.uploadedfile import SimpleUploadedFile
-from unittest.mock import Mock
+from django.core import serializers
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from unittest.mock import Mock, patch
+from PIL import Image, ImageCms, PngImagePlugin
+from yatube.metrics import REGISTRY
  
  
 class ScriptsTest(TestCase):
@@ -214,15 +237,46 @@ class Cache(TestCase):
         self.login_user = Client()
         self.login_user.force_login(self.user)
     
+    def posts_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login_user.get(url)
+        return response, [
+            query for query in queries if 'posts_post' in query['sql']
+        ]
+
     def test_cache(self):
-        first_enter = self.login_user.get(reverse('index'))
+        self.login_user.get(reverse('index'))
+        second_enter, queries = self.posts_queries(reverse('index'))
+        self.assertEqual(queries, [])
         Post.objects.create(author=self.user, text='new_post_test_cache')
-        text = Post.objects.get(pk=1).text
-        second_enter = self.login_user.get(reverse('index'))
-        self.assertNotContains(second_enter, text)
-        cache.clear()
         third_enter = self.login_user.get(reverse('index'))
-        self.assertContains(third_enter, text)
+        self.assertContains(third_enter, 'new_post_test_cache')
+
+    def test_cache_invalidation(self):
+        group = Group.objects.create(title='old_title', slug='cached')
+        post = Post.objects.create(author=self.user, text='text', group=group)
+        urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+        ]
+        for url in urls:
+            self.login_user.get(url)
+        Comment.objects.create(post=post, author=self.user, text='comment')
+        for url in (urls[0], urls[2]):
+            self.assertContains(self.login_user.get(url), 'Комментариев: 1')
+        group.title = 'new_title'
+        group.save()
+        for url in urls:
+            self.assertContains(self.login_user.get(url), 'new_title')
+
+    def test_bogus_urls_make_valid_cache_keys(self):
+        # Ключи, которые не принял бы memcached, дают CacheKeyWarning.
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            for url in ('/foo%20bar/', '/foo%0Abar/followers/',
+                        '/api/users/foo%20bar/', '/foo%20bar/1/'):
+                self.assertEqual(self.login_user.get(url).status_code, 404)
 
 
 class Followings(TestCase):
@@ -328,4 +382,1280 @@ class Commentators(TestCase):
         self.assertEqual(all_comments, 1)
         self.assertEqual(new_comment.text, 'test_text')
         self.assertEqual(new_comment.post, post)
-        self.assertEqual(new_comment.author, self.user)
\ No newline at end of file
+        self.assertEqual(new_comment.author, self.user)
+
+class CommentPages(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='david595')
+        self.post = Post.objects.create(text='viral', author=self.author)
+        self.url = reverse('post', kwargs={
+            'username': self.author.username, 'post_id': self.post.id
+        })
+        cache.clear()
+
+    def add_comments(self, count):
+        start = Comment.objects.count()
+        for number in range(start, start + count):
+            user = User.objects.create_user(username=f'fan{number}')
+            Comment.objects.create(post=self.post, author=user,
+                                   text=f'comment {number}')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_comments(self):
+        self.add_comments(2)
+        few = self.count_queries()
+        self.add_comments(40)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_first_page_and_fragments(self):
+        self.add_comments(45)
+        response = self.client.get(self.url)
+        page = response.context['comments_page']
+        self.assertEqual([item.text for item in page][:2],
+                         ['comment 44', 'comment 43'])
+        self.assertEqual(len(page), 20)
+        self.assertContains(response, 'data-comments-more')
+        shown = [item.text for item in page]
+        fragment_url = reverse('post_comments', kwargs={
+            'username': self.author.username, 'post_id': self.post.id
+        })
+        cursor = page.next_cursor
+        while cursor:
+            response = self.client.get(fragment_url, {'cursor': cursor})
+            self.assertTemplateUsed(response, 'comment_list.html')
+            self.assertNotContains(response, '<html')
+            page = response.context['comments_page']
+            shown += [item.text for item in page]
+            cursor = page.next_cursor
+        self.assertEqual(shown, [f'comment {number}'
+                                 for number in reversed(range(45))])
+        self.assertNotContains(response, 'data-comments-more')
+
+    def post_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return response, [
+            query for query in queries
+            if 'posts_' in query['sql'] and 'django_' not in query['sql']
+        ]
+
+    def test_post_detail_cached(self):
+        self.add_comments(3)
+        _, queries = self.post_queries()
+        self.assertLessEqual(len(queries), 2)
+        response, queries = self.post_queries()
+        self.assertEqual(queries, [])
+        self.assertIs(type(response.context['comments']), QuerySet)
+        self.assertEqual(len(response.context['comments_page']), 3)
+        self.assertContains(response, 'comment 2')
+        self.assertEqual(response.context['post'], self.post)
+
+    def test_more_link_ignores_counter_drift(self):
+        self.add_comments(21)
+        Post.objects.update(comments_count=0)
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context['comments']), 20)
+        self.assertContains(response, '?cursor=')
+        Comment.objects.order_by('created', 'id').first().delete()
+        Post.objects.update(comments_count=99)
+        response = self.client.get(self.url)
+        self.assertNotContains(response, '?cursor=')
+
+    def test_post_detail_follows_changes(self):
+        self.client.get(self.url)
+        self.add_comments(1)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'comment 0')
+        self.post.text = 'edited'
+        self.post.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'edited')
+
+
+class CursorPagination(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='kyle_reese')
+        self.group = Group.objects.create(title='resistance', slug='resistance')
+        self.client = Client()
+        for number in range(25):
+            Post.objects.create(
+                text=f'post {number}', author=self.user, group=self.group
+            )
+        self.url = reverse('group_posts', kwargs={'slug': self.group.slug})
+        self.expected = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def get_page(self, url):
+        cache.clear()
+        return self.client.get(url).context['page']
+
+    def test_walk_forward_and_back(self):
+        seen = []
+        cursors = []
+        url = self.url
+        while True:
+            page = self.get_page(url)
+            seen.extend(page.object_list)
+            if page.next_cursor is None:
+                break
+            cursors.append(page.next_cursor)
+            url = f'{self.url}?cursor={page.next_cursor}'
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(cursors), 2)
+
+        last_page = self.get_page(f'{self.url}?cursor={cursors[-1]}')
+        previous = last_page.previous_cursor
+        page = self.get_page(f'{self.url}?cursor={previous}')
+        self.assertEqual(list(page.object_list), self.expected[10:20])
+        self.assertIsNotNone(page.previous_cursor)
+
+    def test_no_count_or_offset_queries(self):
+        first = self.get_page(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'{self.url}?cursor={first.next_cursor}')
+        sql = ' '.join(
+            query['sql'] for query in queries
+            if 'FROM "posts_post"' in query['sql']
+        ).upper()
+        self.assertNotIn('COUNT(*)', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_legacy_page_links(self):
+        page = self.get_page(f'{self.url}?page=2')
+        self.assertEqual(list(page.object_list), self.expected[10:20])
+        self.assertIsNotNone(page.next_cursor)
+        self.assertIsNotNone(page.previous_cursor)
+
+    def test_broken_cursor_shows_first_page(self):
+        page = self.get_page(f'{self.url}?cursor=garbage!')
+        self.assertEqual(list(page.object_list), self.expected[:10])
+
+
+class FeedQueries(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='john_connor')
+        self.author = User.objects.create_user(username='t800')
+        self.group = Group.objects.create(title='skynet', slug='skynet')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.author.username}),
+            reverse('follow_index'),
+        ]
+
+    def add_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(
+                text=f'post {number}', author=self.author, group=self.group
+            )
+            Comment.objects.create(post=post, author=self.reader, text='ok')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_page_size(self):
+        self.add_posts(1)
+        small = {url: self.count_queries(url) for url in self.urls}
+        self.add_posts(9)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), small[url])
+
+    def test_group_lookup_cached(self):
+        self.add_posts(3)
+        url = reverse('group_posts', kwargs={'slug': self.group.slug})
+        anonymous = Client()
+        anonymous.get(url)
+        Post.objects.create(text='fresh', author=self.author,
+                            group=self.group)
+        with self.assertNumQueries(1):
+            response = anonymous.get(url)
+        self.assertContains(response, 'fresh')
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_group_lookup_follows_group_changes(self):
+        url = reverse('group_posts', kwargs={'slug': self.group.slug})
+        self.client.get(url)
+        self.group.title = 'cyberdyne'
+        self.group.save()
+        self.assertContains(self.client.get(url), 'cyberdyne')
+        self.group.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+
+class Counters(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='miles_dyson')
+        self.author = User.objects.create_user(username='t1000')
+        self.login_user = Client()
+        self.login_user.force_login(self.user)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        self.login_user.post(reverse('new_post'), {'text': 'first'})
+        post = Post.objects.get(author=self.user)
+        self.login_user.post(
+            reverse('add_comment', kwargs={
+                'username': self.user.username, 'post_id': post.id
+            }),
+            {'text': 'comment'}
+        )
+        self.login_user.get(reverse(
+            'profile_follow', kwargs={'username': self.author.username}
+        ))
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+
+        self.login_user.get(reverse(
+            'profile_unfollow', kwargs={'username': self.author.username}
+        ))
+        post.comments.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+
+    def test_profile_page_has_no_count_queries(self):
+        Post.objects.create(text='post', author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.login_user.get(reverse(
+                'profile', kwargs={'username': self.author.username}
+            ))
+        self.assertContains(response, 'Записей: 1')
+        sql = ' '.join(query['sql'] for query in queries).upper()
+        self.assertNotIn('COUNT(', sql)
+
+    def test_recount_repairs_drift(self):
+        post = Post.objects.create(text='post', author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='ok')
+        UserStats.objects.update(posts_count=42)
+        Post.objects.update(comments_count=7)
+        UserStats.objects.filter(user=self.user).delete()
+        call_command('recount_stats', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+
+    def test_fixture_load_skips_signals(self):
+        post = Post.objects.create(text='post', author=self.author)
+        comment = Comment.objects.create(post=post, author=self.user, text='ok')
+        data = serializers.serialize('json', [comment, post])
+        Post.objects.all().delete()
+        for obj in serializers.deserialize('json', data):
+            obj.save()
+        call_command('recount_stats', stdout=StringIO())
+        self.assertEqual(Post.objects.get().comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_post_delete_skips_per_comment_work(self):
+        post = Post.objects.create(text='post', author=self.author)
+        for number in range(5):
+            Comment.objects.create(post=post, author=self.user,
+                                   text=f'comment {number}')
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        updates = [query for query in queries
+                   if query['sql'].startswith('UPDATE "posts_post"')]
+        self.assertEqual(updates, [])
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(search.SearchResults('comment').count(), 0)
+
+    def test_comment_delete_still_counts(self):
+        post = Post.objects.create(text='post', author=self.author)
+        comment = Comment.objects.create(post=post, author=self.user, text='ok')
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_delete_user_with_posts_and_follows(self):
+        own = Post.objects.create(text='own', author=self.user)
+        other = Post.objects.create(text='other', author=self.author)
+        Comment.objects.create(post=own, author=self.author, text='on own')
+        Comment.objects.create(post=other, author=self.user, text='on other')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.author, author=self.user)
+        user_id = self.user.pk
+        self.user.delete()
+        self.assertFalse(UserStats.objects.filter(user_id=user_id).exists())
+        stats = self.stats(self.author)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (1, 0, 0),
+        )
+        other.refresh_from_db()
+        self.assertEqual(other.comments_count, 0)
+
+
+
+class Timelines(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='sarah_connor')
+        self.author = User.objects.create_user(username='t850')
+        self.login_user = Client()
+        self.login_user.force_login(self.reader)
+
+    def follow(self):
+        self.login_user.get(reverse(
+            'profile_follow', kwargs={'username': self.author.username}
+        ))
+
+    def feed(self):
+        response = self.login_user.get(reverse('follow_index'))
+        return [post.text for post in response.context['page']]
+
+    def test_fan_out_backfill_and_unfollow(self):
+        Post.objects.create(text='old', author=self.author)
+        self.follow()
+        Post.objects.create(text='new', author=self.author)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(self.feed(), ['new', 'old'])
+        self.login_user.get(reverse(
+            'profile_unfollow', kwargs={'username': self.author.username}
+        ))
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_timeline_is_capped(self):
+        self.follow()
+        for number in range(6):
+            Post.objects.create(text=f'post {number}', author=self.author)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 3)
+        self.assertEqual(self.feed(), ['post 5', 'post 4', 'post 3'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_authors_are_read_on_demand(self):
+        self.follow()
+        Post.objects.create(text='for everyone', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), ['for everyone'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=4)
+    def test_posts_stay_when_author_drops_below_limit(self):
+        fan = User.objects.create_user(username='kyle_reese')
+        self.follow()
+        for number in range(2):
+            other = User.objects.create_user(username=f'resistance{number}')
+            Follow.objects.create(user=other, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        Post.objects.create(text='while popular', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.feed(), ['while popular'])
+        Follow.objects.get(user=fan).delete()
+        self.assertEqual(self.feed(), ['while popular'])
+
+        Follow.objects.create(user=fan, author=self.author)
+        Post.objects.create(text='popular again', author=self.author)
+        follows.unfollow(fan, [self.author])
+        self.assertEqual(self.feed(), ['popular again', 'while popular'])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+
+
+
+class BulkFollows(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='miles_dyson')
+        self.authors = [
+            User.objects.create_user(username=f'skynet{number}')
+            for number in range(3)
+        ]
+        for author in self.authors:
+            Post.objects.create(text=f'by {author.username}', author=author)
+        self.client.force_login(self.reader)
+        self.url = reverse('api_following')
+
+    def send(self, method, usernames):
+        return getattr(self.client, method)(
+            self.url, json.dumps({'authors': usernames}),
+            content_type='application/json',
+        )
+
+    def following(self):
+        return UserStats.objects.get(user=self.reader).following_count
+
+    def test_follow_many_is_one_insert(self):
+        usernames = [author.username for author in self.authors]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.send('post', usernames + ['nobody', 'miles_dyson'])
+        self.assertEqual(response.json(), {
+            'changed': 3, 'not_found': ['nobody'],
+        })
+        inserts = [query for query in queries
+                   if query['sql'].startswith('INSERT')
+                   and 'INTO "posts_follow"' in query['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self.following(), 3)
+        self.assertEqual(UserStats.objects.get(
+            user=self.authors[0]
+        ).followers_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+        self.assertEqual(self.send('post', usernames).json()['changed'], 0)
+        self.assertEqual(Follow.objects.count(), 3)
+        self.assertEqual(self.following(), 3)
+
+    def test_unfollow_many(self):
+        self.send('post', [author.username for author in self.authors])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.send('delete', [self.authors[0].username,
+                                            self.authors[1].username])
+        self.assertEqual(response.json()['changed'], 2)
+        deletes = [query for query in queries
+                   if query['sql'].startswith('DELETE FROM "posts_follow"')]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(self.following(), 1)
+        self.assertEqual(UserStats.objects.get(
+            user=self.authors[0]
+        ).followers_count, 0)
+        self.assertEqual(list(TimelineEntry.objects.values_list(
+            'author', flat=True
+        )), [self.authors[2].pk])
+        self.assertEqual(
+            self.send('delete', [self.authors[0].username]).json()['changed'],
+            0,
+        )
+
+    def test_follow_pages_update(self):
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page']), 0)
+        self.send('post', [self.authors[0].username])
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page']), 1)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.post(
+            self.url, 'oops', content_type='application/json'
+        ).status_code, 400)
+        self.assertEqual(self.send('post', 'skynet0').status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.send('post', ['skynet0']).status_code, 401)
+
+
+
+class FollowLists(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='sarah_c')
+        self.viewer = User.objects.create_user(username='kyle_r')
+        self.fans = [
+            User.objects.create_user(username=f'fan{number:02}')
+            for number in range(35)
+        ]
+        Follow.objects.bulk_create(
+            Follow(user=fan, author=self.author) for fan in self.fans
+        )
+        Follow.objects.bulk_create(
+            Follow(user=self.viewer, author=fan) for fan in self.fans[::2]
+        )
+        self.client.force_login(self.viewer)
+        self.url = reverse('followers', kwargs={'username': 'sarah_c'})
+
+    def test_followers_pages(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        follow_queries = [query for query in queries
+                          if '"posts_follow"' in query['sql']]
+        self.assertEqual(len(follow_queries), 2)
+        users = response.context['users']
+        self.assertEqual([user.username for user in users][:2],
+                         ['fan34', 'fan33'])
+        self.assertEqual(len(users), 30)
+        self.assertEqual(
+            {user.username: user.is_followed for user in users}['fan34'],
+            True,
+        )
+        self.assertFalse(users[1].is_followed)
+        self.assertContains(response, 'Отписаться')
+        response = self.client.get(
+            self.url, {'cursor': response.context['page'].next_cursor}
+        )
+        self.assertEqual([user.username for user in response.context['users']],
+                         ['fan04', 'fan03', 'fan02', 'fan01', 'fan00'])
+
+    def test_following_page_and_flags_follow_changes(self):
+        url = reverse('following', kwargs={'username': 'kyle_r'})
+        response = self.client.get(url)
+        self.assertEqual(len(response.context['users']), 18)
+        self.assertTrue(all(user.is_followed
+                            for user in response.context['users']))
+        follows.unfollow(self.viewer, [self.fans[0]])
+        response = self.client.get(self.url, {
+            'cursor': self.client.get(self.url).context['page'].next_cursor
+        })
+        self.assertFalse(response.context['users'][-1].is_followed)
+
+    def test_api(self):
+        response = self.client.get(reverse(
+            'api_followers', kwargs={'username': 'sarah_c'}
+        ))
+        data = response.json()
+        self.assertEqual(len(data['results']), 30)
+        self.assertEqual(data['results'][0]['username'], 'fan34')
+        self.assertIs(data['results'][0]['followed_by_viewer'], True)
+        self.assertIs(data['results'][1]['followed_by_viewer'], False)
+        self.assertIsNotNone(data['next'])
+        self.client.logout()
+        data = self.client.get(reverse(
+            'api_following_list', kwargs={'username': 'fan00'}
+        )).json()
+        self.assertEqual(data['results'][0]['username'], 'sarah_c')
+        self.assertIsNone(data['results'][0]['followed_by_viewer'])
+
+
+class PostCards(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='kate_brewster')
+        self.reader = User.objects.create_user(username='john_connor')
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.post = Post.objects.create(text='card', author=self.author)
+        cache.clear()
+
+    def test_cards_are_reused_between_pages(self):
+        self.reader_client.get(reverse('index'))
+        bump('index')
+        response = self.reader_client.get(reverse('index'))
+        self.assertTemplateUsed(response, 'index.html')
+        self.assertTemplateNotUsed(response, 'post_item.html')
+        self.assertContains(response, 'card')
+
+        response = self.reader_client.get(reverse(
+            'profile', kwargs={'username': self.author.username}
+        ))
+        self.assertTemplateNotUsed(response, 'post_item.html')
+
+    def test_edit_link_is_per_viewer(self):
+        edit_url = reverse('post_edit', kwargs={
+            'username': self.author.username, 'post_id': self.post.id
+        })
+        self.assertNotContains(self.reader_client.get(reverse('index')), edit_url)
+        self.assertContains(self.author_client.get(reverse('index')), edit_url)
+
+    def test_edit_refreshes_card(self):
+        self.reader_client.get(reverse('index'))
+        self.author_client.post(
+            reverse('post_edit', kwargs={
+                'username': self.author.username, 'post_id': self.post.id
+            }),
+            {'text': 'edited card'}
+        )
+        self.assertContains(self.reader_client.get(reverse('index')), 'edited card')
+
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'yatube.cache_backends.TwoTierCache',
+        'OPTIONS': {'L2': 'shared', 'L1_PREFIXES': ['page:']},
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-tests',
+    },
+})
+class TwoTierCacheTest(TestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.shared = caches['shared']
+        self.cache.clear()
+
+    def test_hot_keys_are_served_from_process_memory(self):
+        self.cache.set('page:index', 'html')
+        self.shared.delete('page:index')
+        self.assertEqual(self.cache.get('page:index'), 'html')
+        self.assertEqual(self.cache.get_many(['page:index']),
+                         {'page:index': 'html'})
+
+    def test_other_keys_always_go_to_shared_cache(self):
+        self.cache.set('version:index', 1)
+        self.shared.set('version:index', 2)
+        self.assertEqual(self.cache.get('version:index'), 2)
+
+    def test_shared_values_are_promoted(self):
+        self.shared.set('page:group', 'html')
+        self.assertEqual(self.cache.get('page:group'), 'html')
+        self.shared.delete('page:group')
+        self.assertEqual(self.cache.get('page:group'), 'html')
+        self.cache.delete('page:group')
+        self.assertIsNone(self.cache.get('page:group'))
+
+
+class ExplainFeeds(TestCase):
+    def test_command_leaves_database_untouched(self):
+        out = StringIO()
+        call_command('explain_feeds', seed=50, users=10, repeat=1, stdout=out)
+        self.assertIn('Без индексов', out.getvalue())
+        self.assertEqual(Post.objects.count(), 0)
+        self.assertEqual(User.objects.count(), 0)
+
+
+
+class Search(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='dyson')
+        self.client = Client()
+        self.neural = Post.objects.create(
+            text='Нейронный процессор', author=self.user
+        )
+        self.other = Post.objects.create(text='Про погоду', author=self.user)
+        Comment.objects.create(
+            post=self.other, author=self.user, text='а процессор где?'
+        )
+
+    def found(self, query):
+        response = self.client.get(reverse('search'), {'q': query})
+        return [post.id for post in response.context['page']]
+
+    def check_search(self):
+        self.assertEqual(self.found('процессор'), [self.neural.id, self.other.id])
+        self.assertEqual(self.found('нейронный ПРОЦЕССОР'), [self.neural.id])
+        self.assertEqual(self.found(''), [])
+        self.neural.text = 'Жидкий металл'
+        self.neural.save()
+        self.assertEqual(self.found('процессор'), [self.other.id])
+        self.other.comments.all().delete()
+        self.assertEqual(self.found('процессор'), [])
+        self.other.delete()
+        self.assertEqual(self.found('погоду'), [])
+
+    def test_fts_search(self):
+        self.assertTrue(search.use_fts())
+        self.check_search()
+
+    def test_inverted_index_search(self):
+        with patch('posts.search.use_fts', return_value=False):
+            search.rebuild()
+            self.check_search()
+
+    def check_admin_search(self):
+        Post.objects.bulk_create(
+            Post(text=f'процессор {number}', author=self.user)
+            for number in range(1001)
+        )
+        search.rebuild()
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'процессор'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1003)
+
+    def test_admin_search_is_not_capped(self):
+        self.check_admin_search()
+
+    def test_admin_inverted_index_search_is_not_capped(self):
+        with patch('posts.search.use_fts', return_value=False):
+            self.check_admin_search()
+
+
+class Thumbnails(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='sarah_connor')
+        self.client.force_login(self.user)
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+            b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+            b'\x02\x4c\x01\x00\x3b'
+        )
+        with patch('posts.thumbnails.schedule') as schedule:
+            self.client.post(reverse('new_post'), {
+                'text': 'with image',
+                'image': SimpleUploadedFile('small.gif', small_gif,
+                                            content_type='image/gif'),
+            })
+        self.post = Post.objects.get(text='with image')
+        schedule.assert_called_once_with(self.post)
+        cache.clear()
+
+    def test_page_shows_placeholder_until_generated(self):
+        with patch('posts.thumbnails.schedule') as schedule, \
+                patch('sorl.thumbnail.default.engine.get_image') as get_image:
+            response = self.client.get(reverse('index'))
+        schedule.assert_called_once_with(self.post)
+        get_image.assert_not_called()
+        self.assertContains(response, 'data:image/svg+xml')
+        self.assertNotContains(response, '/media/cache/')
+
+        thumbnails.generate(self.post.pk)
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '/media/cache/')
+        self.assertNotContains(response, 'data:image/svg+xml')
+        self.assertContains(response, '<source type="image/webp"')
+        for width in (480, 960, 1440):
+            self.assertContains(response, f'.webp {width}w')
+
+    @override_settings(THUMBNAIL_RETRY_TIMEOUT=60)
+    def test_failed_image_retried_after_timeout(self):
+        name = self.post.image.name
+        with patch('posts.thumbnails.generate', return_value=False) as run, \
+                patch('posts.thumbnails.time.monotonic', return_value=100):
+            thumbnails._submit(self.post.pk, name)
+            thumbnails._submit(self.post.pk, name)
+        self.assertEqual(run.call_count, 1)
+        with patch('posts.thumbnails.generate', return_value=True) as run, \
+                patch('posts.thumbnails.time.monotonic', return_value=161):
+            thumbnails._submit(self.post.pk, name)
+        run.assert_called_once_with(self.post.pk)
+        self.assertNotIn(name, thumbnails._failed)
+
+    @override_settings(POST_IMAGE_FORMATS=['AVIF', 'WEBP'])
+    def test_avif_needs_plugin(self):
+        with patch('posts.thumbnails.pillow_avif', None):
+            self.assertEqual(thumbnails.image_formats(), ['WEBP'])
+        with patch('posts.thumbnails.pillow_avif', Mock()):
+            self.assertEqual(thumbnails.image_formats(), ['AVIF', 'WEBP'])
+
+
+class Uploads(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='miles_dyson')
+        self.client.force_login(self.user)
+
+    def upload(self, size, **params):
+        buffer = BytesIO()
+        image = Image.new('RGB', size, (200, 10, 10))
+        exif = Image.Exif()
+        exif[0x010f] = 'Cyberdyne'
+        image.save(buffer, 'JPEG', exif=exif, **params)
+        return self.client.post(reverse('new_post'), {
+            'text': 'upload',
+            'image': SimpleUploadedFile('photo.jpg', buffer.getvalue(),
+                                        content_type='image/jpeg'),
+        })
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_too_large_file_is_rejected(self):
+        response = self.upload((300, 300), quality=100)
+        self.assertFormError(response, 'form', 'image',
+                             'Файл слишком большой: допустимо не больше 1,0\xa0КБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_is_rejected(self):
+        response = self.upload((50, 50))
+        self.assertFormError(response, 'form', 'image',
+                             'Изображение слишком большое: 50×50 пикселей.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=40)
+    def test_large_image_is_shrunk_and_stripped(self):
+        self.upload((200, 100))
+        with Image.open(Post.objects.get().image) as image:
+            self.assertEqual(image.size, (40, 20))
+            self.assertEqual(len(image.getexif()), 0)
+
+    @override_settings(POST_IMAGE_MAX_SIDE=40)
+    def test_large_png_is_stripped(self):
+        image = Image.new('RGBA', (200, 100), (200, 10, 10, 128))
+        image = image.convert('P')
+        image.info['transparency'] = 0
+        text = PngImagePlugin.PngInfo()
+        text.add_text('Author', 'Cyberdyne')
+        buffer = BytesIO()
+        image.save(buffer, 'PNG', pnginfo=text, transparency=0,
+                   icc_profile=ImageCms.ImageCmsProfile(
+                       ImageCms.createProfile('sRGB')
+                   ).tobytes())
+        self.client.post(reverse('new_post'), {
+            'text': 'upload',
+            'image': SimpleUploadedFile('drawing.png', buffer.getvalue(),
+                                        content_type='image/png'),
+        })
+        with Image.open(Post.objects.get().image) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertEqual(image.size, (40, 20))
+            self.assertEqual(image.mode, 'RGBA')
+            self.assertNotIn('Author', image.info)
+            self.assertNotIn('icc_profile', image.info)
+
+
+class TempMediaTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media)
+        self.settings_override.enable()
+        cache.clear()
+        self.user = User.objects.create_user(username='john_connor')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media)
+
+    def gif(self, name, color=(200, 10, 10)):
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10), color).save(buffer, 'GIF')
+        return SimpleUploadedFile(name, buffer.getvalue(),
+                                  content_type='image/gif')
+
+    def age(self, name):
+        os.utime(os.path.join(self.media, name), (0, 0))
+
+
+class ThumbnailGarbage(TempMediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.create(
+            text='kept', author=self.user, image=self.gif('old.gif')
+        )
+        thumbnails.generate(self.post.pk)
+
+    def cached_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(path, name), self.media)
+            for path, dirs, names in os.walk(os.path.join(self.media, 'cache'))
+            for name in names
+        )
+
+    def test_cleanup(self):
+        old_files = self.cached_files()
+        old_image = self.post.image.name
+        self.age(old_image)
+        self.post.image = self.gif('new.gif', color=(10, 200, 10))
+        self.post.save()
+        thumbnails.generate(self.post.pk)
+        new_files = set(self.cached_files()) - set(old_files)
+        self.assertEqual(len(old_files), len(new_files))
+
+        os.makedirs(os.path.join(self.media, 'cache', 'zz'))
+        for name in ('stray.jpg', 'fresh.jpg'):
+            with open(os.path.join(self.media, 'cache', 'zz', name), 'wb') as f:
+                f.write(b'x' * 10)
+        os.utime(os.path.join(self.media, 'cache', 'zz', 'stray.jpg'), (0, 0))
+
+        out = StringIO()
+        call_command('cleanup_thumbnails', '--dry-run', stdout=out)
+        self.assertIn(f'Будет удалено файлов: {len(old_files) + 2}', out.getvalue())
+        self.assertEqual(len(self.cached_files()), len(old_files) * 2 + 2)
+
+        call_command('cleanup_thumbnails', stdout=StringIO())
+        self.assertEqual(
+            self.cached_files(),
+            sorted(new_files | {os.path.join('cache', 'zz', 'fresh.jpg')})
+        )
+        self.assertFalse(os.path.exists(os.path.join(self.media, old_image)))
+        self.assertTrue(os.path.exists(self.post.image.path))
+        cache.clear()
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '/media/cache/')
+        self.assertNotContains(response, 'data:image/svg+xml')
+
+    def test_cleanup_drops_obsolete_variants(self):
+        self.assertEqual(len(self.cached_files()), 4)
+        with override_settings(POST_IMAGE_WIDTHS=[480]):
+            call_command('cleanup_thumbnails', stdout=StringIO())
+            self.assertEqual(len(self.cached_files()), 2)
+            self.assertIsNotNone(thumbnails.ready(self.post))
+        # Строки удалены и из кеша, через который sorl их читает.
+        self.assertIsNone(thumbnails.backend.lookup(
+            self.post.image, '960x339', crop='center', upscale=True,
+            format='WEBP',
+        ))
+
+
+class ContentAddressedImages(TempMediaTestCase):
+    def test_same_bytes_share_one_file(self):
+        first = Post.objects.create(
+            text='first', author=self.user, image=self.gif('a.gif')
+        )
+        second = Post.objects.create(
+            text='second', author=self.user, image=self.gif('b.GIF')
+        )
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertRegex(name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(name)]
+        )
+
+        self.age(name)
+        first.delete()
+        self.assertFalse(release(name))
+        self.assertTrue(os.path.exists(second.image.path))
+        second.delete()
+        self.assertTrue(release(name))
+        self.assertFalse(os.path.exists(os.path.join(self.media, name)))
+
+    def test_recently_reused_file_is_kept(self):
+        post = Post.objects.create(
+            text='post', author=self.user, image=self.gif('a.gif')
+        )
+        post.delete()
+        self.assertFalse(release(post.image.name))
+        self.assertTrue(os.path.exists(post.image.path))
+
+    def test_dedupe_existing_copies(self):
+        names = []
+        for name in ('pil_color_1.gif', 'pil_color_2.gif'):
+            path = os.path.join(self.media, 'posts', name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(self.gif(name).read())
+            self.age(os.path.join('posts', name))
+            post = Post.objects.create(text=name, author=self.user)
+            Post.objects.filter(pk=post.pk).update(image=f'posts/{name}')
+            names.append(f'posts/{name}')
+
+        out = StringIO()
+        call_command('dedupe_images', stdout=out)
+        self.assertIn('Переименовано картинок: 2, удалено копий: 2', out.getvalue())
+        images = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(images), 1)
+        for name in names:
+            self.assertFalse(os.path.exists(os.path.join(self.media, name)))
+        self.assertTrue(os.path.exists(os.path.join(self.media, images.pop())))
+
+
+class Api(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='t800')
+        self.reader = User.objects.create_user(username='sarah_connor')
+        self.group = Group.objects.create(title='Skynet', slug='skynet')
+        for number in range(12):
+            Post.objects.create(
+                text=f'post {number}', author=self.author, group=self.group
+            )
+        self.post = Post.objects.latest('id')
+        Comment.objects.create(post=self.post, author=self.reader, text='hi')
+        cache.clear()
+
+    def test_feeds(self):
+        for url in (
+            reverse('api_index'),
+            reverse('api_group', kwargs={'slug': self.group.slug}),
+            reverse('api_profile', kwargs={'username': self.author.username}),
+        ):
+            data = self.client.get(url).json()
+            self.assertEqual(len(data['results']), 10)
+            self.assertEqual(data['results'][0]['text'], 'post 11')
+            self.assertEqual(data['results'][0]['comments_count'], 1)
+            self.assertIsNone(data['previous'])
+            data = self.client.get(data['next']).json()
+            self.assertEqual(len(data['results']), 2)
+            self.assertIsNone(data['next'])
+        self.assertEqual(data['author']['posts_count'], 12)
+
+    def test_profiles_of_users_named_like_routes(self):
+        for username in ('posts', 'follow', 'following'):
+            user = User.objects.create_user(username=username)
+            Post.objects.create(text=f'by {username}', author=user)
+            response = self.client.get(
+                reverse('api_profile', kwargs={'username': username})
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'][0]['text'],
+                             f'by {username}')
+
+    def test_post_with_comments(self):
+        data = self.client.get(reverse('api_post', kwargs={
+            'username': self.author.username, 'post_id': self.post.id
+        })).json()
+        self.assertEqual(data['post']['text'], 'post 11')
+        self.assertEqual([c['text'] for c in data['results']], ['hi'])
+
+    def test_follow_feed(self):
+        url = reverse('api_follow')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(url).json()['results'], [])
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(len(self.client.get(url).json()['results']), 10)
+
+    def test_not_modified(self):
+        url = reverse('api_index')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='new', author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ConditionalPages(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='t800')
+        self.group = Group.objects.create(title='Skynet', slug='skynet')
+        self.post = Post.objects.create(
+            text='judgment day', author=self.author, group=self.group
+        )
+        self.client.force_login(self.author)
+        self.urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.author.username}),
+            reverse('post', kwargs={
+                'username': self.author.username, 'post_id': self.post.id
+            }),
+        ]
+        cache.clear()
+
+    def test_not_modified_before_rendering(self):
+        for url in self.urls:
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.templates, [])
+            self.assertEqual(
+                Client().get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+            )
+
+    def test_relogin_changes_etag(self):
+        url = self.urls[-1]
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+        # logout() в тестовом клиенте сбрасывает и CSRF-cookie, как
+        # настоящий выход и вход.
+        self.client.logout()
+        self.client.force_login(self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_edit_changes_etag(self):
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        self.post.text = 'no fate'
+        self.post.save()
+        for url, etag in zip(self.urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertContains(response, 'no fate')
+
+
+class BulkLoad(TestCase):
+    def test_loads_dump(self):
+        out = StringIO()
+        call_command('bulk_load', 'dump.json', stdout=out)
+        self.assertIn('Загружено строк', out.getvalue())
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Comment.objects.count(), 19)
+        self.assertEqual(Follow.objects.count(), 1)
+        post = Post.objects.order_by('pub_date').first()
+        self.assertEqual(post.pub_date.year, 1854)
+        author = User.objects.get(username='leo')
+        self.assertEqual(author.stats.posts_count, 36)
+        follow = Follow.objects.get()
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=follow.user).exists()
+        )
+        user = User.objects.create_user(username='newcomer')
+        self.assertGreater(
+            user.pk, User.objects.exclude(pk=user.pk).latest('pk').pk
+        )
+
+    def test_ignore_conflicts(self):
+        call_command('bulk_load', 'dump.json', '--skip-derived',
+                     stdout=StringIO())
+        call_command('bulk_load', 'dump.json', '--skip-derived',
+                     '--ignore-conflicts', stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 40)
+
+    def test_iter_json_array_small_chunks(self):
+        stream = StringIO(' [ {"a": "x, ]"},\n[1, 2], 12345 ,"}"] ')
+        self.assertEqual(
+            list(iter_json_array(stream, chunk_size=2)),
+            [{'a': 'x, ]'}, [1, 2], 12345, '}'],
+        )
+        with self.assertRaises(ValueError):
+            list(iter_json_array(StringIO('[1, 2'), chunk_size=2))
+
+
+class StreamExport(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='sarah77')
+        self.old = Post.objects.create(text='old', author=self.author)
+        Post.objects.filter(pk=self.old.pk).update(
+            pub_date='2019-01-01T00:00:00Z'
+        )
+        self.new = Post.objects.create(text='judgment day',
+                                       author=self.author)
+
+    def test_jsonl_since(self):
+        out = StringIO()
+        call_command('stream_export', 'posts', '--since', '2020-01-01',
+                     stdout=out, stderr=StringIO())
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([record['id'] for record in records],
+                         [self.new.pk])
+        self.assertEqual(records[0]['text'], 'judgment day')
+        self.assertEqual(records[0]['author_id'], self.author.pk)
+
+    def test_csv_gzip(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'posts.csv.gz')
+        call_command('stream_export', 'posts', '--format', 'csv',
+                     '-o', path, stdout=StringIO())
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as stream:
+            table = list(csv.DictReader(stream))
+        self.assertEqual([row['text'] for row in table],
+                         ['old', 'judgment day'])
+        self.assertTrue(table[0]['pub_date'].startswith('2019-01-01'))
+
+    def test_admin_action(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:posts_post_changelist'), {
+            'action': 'export_jsonl',
+            '_selected_action': [self.old.pk],
+        })
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 1)
+        self.assertIn('"text": "old"', content)
+        Follow.objects.create(user=admin, author=self.author)
+        response = self.client.post(reverse('admin:posts_follow_changelist'), {
+            'action': 'export_csv',
+            '_selected_action': list(Follow.objects.values_list('pk', flat=True)),
+        })
+        table = list(csv.DictReader(
+            b''.join(response.streaming_content).decode().splitlines()
+        ))
+        self.assertEqual(table, [{
+            'id': str(Follow.objects.get().pk),
+            'user_id': str(admin.pk),
+            'author_id': str(self.author.pk),
+        }])
+        self.assertIn('follows.csv', response['Content-Disposition'])
+        self.assertEqual(self.client.get(
+            reverse('admin:posts_comment_changelist')
+        ).status_code, 200)
+
+
+class Seeding(TempMediaTestCase):
+    def test_seed(self):
+        call_command('seed', users=40, posts=300, comments=200, follows=3,
+                     celebrities=2, celebrity_share=0.5, images=2, seed=7,
+                     stdout=StringIO())
+        self.assertEqual(User.objects.filter(
+            username__startswith='seed').count(), 40)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        counts = sorted(UserStats.objects.values_list(
+            'posts_count', flat=True), reverse=True)
+        self.assertEqual(sum(counts), 300)
+        self.assertGreater(counts[0], counts[len(counts) // 2] * 5)
+        self.assertFalse(Comment.objects.filter(
+            created__lt=F('post__pub_date')).exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_prefix_taken(self):
+        User.objects.create_user(username='seed0')
+        with self.assertRaises(CommandError):
+            call_command('seed', users=1, posts=0, comments=0,
+                         stdout=StringIO())
+
+
+class Benchmarks(TestCase):
+    def setUp(self):
+        call_command('seed', users=20, posts=100, comments=50, follows=3,
+                     seed=3, stdout=StringIO())
+        cache.clear()
+
+    def test_every_url_and_rollback(self):
+        posts = Post.objects.count()
+        comments = Comment.objects.count()
+        follows = Follow.objects.count()
+        results = Benchmark(requests=2, warmup=1, seed=1).run()
+        self.assertEqual(set(results), {
+            pattern.name for pattern in urls.urlpatterns
+        })
+        for name, row in results.items():
+            self.assertEqual(row['errors'], 0, name)
+            self.assertLessEqual(row['p50'], row['p99'])
+        self.assertEqual(Post.objects.count(), posts)
+        self.assertEqual(Comment.objects.count(), comments)
+        self.assertEqual(Follow.objects.count(), follows)
+
+    def test_baseline(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'baseline.json')
+        call_command('benchmark', 'index', 'post', requests=2,
+                     save=path, stdout=StringIO())
+        with open(path) as stream:
+            baseline = json.load(stream)
+        self.assertEqual(set(baseline), {'index', 'post'})
+        baseline['post']['queries'] = 0
+        with open(path, 'w') as stream:
+            json.dump(baseline, stream)
+        with self.assertRaisesMessage(CommandError, 'post: запросов'):
+            call_command('benchmark', 'post', requests=2, baseline=path,
+                         stdout=StringIO())
+
+
+class Metrics(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='sarah77')
+        Post.objects.create(text='judgment day', author=self.author)
+        cache.clear()
+        REGISTRY.clear()
+
+    @override_settings(METRICS_SAMPLE_RATE=1.0)
+    def test_sampled_requests(self):
+        with self.assertLogs('yatube.metrics', 'INFO') as logs:
+            self.client.get(reverse('index'))
+            self.client.get(reverse('index'))
+        first, second = [json.loads(record.getMessage())
+                         for record in logs.records]
+        self.assertEqual(first['view'], 'index')
+        self.assertGreater(first['db_queries'], 0)
+        self.assertGreater(first['template_ms'], 0)
+        self.assertEqual(first['cache']['page'], {'hits': 0, 'misses': 1})
+        self.assertEqual(second['cache']['page'], {'hits': 1, 'misses': 0})
+        self.assertEqual(second['db_queries'], 0)
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn(
+            'yatube_requests_total{view="index",method="GET",status="200"} 2',
+            text,
+        )
+        self.assertIn('yatube_db_queries_bucket{view="index",le="+Inf"} 2',
+                      text)
+        self.assertIn('yatube_cache_requests_total{view="index",'
+                      'cache="page",result="hit"} 1', text)
+        self.assertNotIn('view="metrics"', text)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests(self):
+        self.client.get(reverse('index'))
+        text = self.client.get('/metrics').content.decode()
+        self.assertIn('yatube_request_duration_seconds_count{view="index"} 1',
+                      text)
+        self.assertNotIn('yatube_sampled_requests_total', text)
+
+    def test_metrics_only_for_allowed_ips(self):
+        response = Client(REMOTE_ADDR='192.0.2.1').get('/metrics')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,209 @@
+import os
+import time
+
+from django.core.cache import InvalidCacheBackendError, cache, caches
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import deserialize, serialize
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+from .models import Post
+from .thumbnails import thumbnail_keys
+
+
+class ThumbnailCleanup:
+    """Сборка мусора миниатюр: KV-хранилище sorl и дерево media/cache.
+
+    Строки KV читаются пачками по ключу (keyset), каталоги обходятся
+    через os.scandir, поэтому память не зависит от числа миниатюр.
+    Строки меняются через модель KVStore, а копии в кеше, через который
+    их читает cached_db-хранилище sorl, при этом сбрасываются.
+    Удаляются:
+
+    * исходники, на которые не ссылается ни один пост (пост удалён или
+      картинку заменили), вместе со всеми их миниатюрами;
+    * миниатюры живых исходников, которых нет среди текущих нарезок
+      (поменялись POST_IMAGE_WIDTHS/FORMATS);
+    * строки миниатюр, чьих файлов больше нет, и списки миниатюр без
+      исходника;
+    * файлы в media/cache без строки в KV старше ``grace`` секунд —
+      более свежие может прямо сейчас дописывать воркер;
+    * картинки постов, на которые больше никто не ссылается (их не
+      удалил release() из-за RELEASE_GRACE), тоже старше ``grace``.
+    """
+
+    def __init__(self, dry_run=False, grace=60 * 60, batch_size=1000):
+        self.dry_run = dry_run
+        self.grace = grace
+        self.batch_size = batch_size
+        self.rows = 0
+        self.files = 0
+        self.bytes = 0
+
+    def run(self):
+        self.clean_images()
+        self.clean_thumbnail_lists()
+        self.clean_files()
+        self.clean_originals()
+        return self
+
+    def _batches(self, identity):
+        prefix = add_prefix("", identity)
+        last = prefix
+        while True:
+            batch = list(KVStore.objects.filter(
+                key__startswith=prefix, key__gt=last
+            ).order_by("key").values_list("key", "value")[:self.batch_size])
+            if not batch:
+                return
+            yield [(del_prefix(key), value) for key, value in batch]
+            last = batch[-1][0]
+
+    def _delete_rows(self, keys, identity="image"):
+        keys = [add_prefix(key, identity) for key in keys]
+        if not keys:
+            return
+        rows = KVStore.objects.filter(key__in=keys)
+        if self.dry_run:
+            self.rows += rows.count()
+            return
+        self.rows += rows.delete()[0]
+        self._cache().delete_many(keys)
+
+    def _update_row(self, key, value, identity):
+        key = add_prefix(key, identity)
+        KVStore.objects.filter(key=key).update(value=serialize(value))
+        self._cache().delete(key)
+
+    def _cache(self):
+        try:
+            return caches[thumbnail_settings.THUMBNAIL_CACHE]
+        except InvalidCacheBackendError:
+            return cache
+
+    def _delete_file(self, name, storage=None):
+        storage = storage or default.storage
+        try:
+            size = storage.size(name)
+        except OSError:
+            return
+        self.files += 1
+        self.bytes += size
+        if not self.dry_run:
+            storage.delete(name)
+
+    def _delete_thumbnails(self, keys):
+        """Удалить миниатюры по ключам: и файлы, и строки."""
+        rows = KVStore.objects.filter(
+            key__in=[add_prefix(key) for key in keys]
+        ).values_list("value", flat=True)
+        for value in rows:
+            self._delete_file(deserialize_image_file(value).name)
+        self._delete_rows(keys)
+
+    def clean_images(self):
+        for batch in self._batches("image"):
+            sources = {}
+            missing = []
+            for key, value in batch:
+                image = deserialize_image_file(value)
+                if not image.name.startswith(
+                    thumbnail_settings.THUMBNAIL_PREFIX
+                ):
+                    sources[key] = image
+                elif not image.exists():
+                    missing.append(key)
+            self._delete_rows(missing)
+            if sources:
+                self._clean_sources(sources)
+
+    def _clean_sources(self, sources):
+        live = set(Post.objects.filter(
+            image__in=[image.name for image in sources.values()]
+        ).values_list("image", flat=True))
+        lists = dict(KVStore.objects.filter(key__in=[
+            add_prefix(key, "thumbnails") for key in sources
+        ]).values_list("key", "value"))
+        for key, image in sources.items():
+            listed = set(deserialize(
+                lists.get(add_prefix(key, "thumbnails"), "[]")
+            ))
+            if image.name not in live:
+                self._delete_thumbnails(listed)
+                self._delete_rows([key], "thumbnails")
+                self._delete_rows([key])
+                continue
+            obsolete = listed - thumbnail_keys(image)
+            if obsolete:
+                self._delete_thumbnails(obsolete)
+                if not self.dry_run:
+                    self._update_row(
+                        key, sorted(listed - obsolete), "thumbnails"
+                    )
+
+    def clean_thumbnail_lists(self):
+        for batch in self._batches("thumbnails"):
+            sources = set(del_prefix(key) for key in KVStore.objects.filter(
+                key__in=[add_prefix(key) for key, value in batch]
+            ).values_list("key", flat=True))
+            for key, value in batch:
+                if key not in sources:
+                    self._delete_thumbnails(deserialize(value))
+                    self._delete_rows([key], "thumbnails")
+
+    def _walk(self, path):
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._walk(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    def _old_files(self, storage, directory):
+        """Имена файлов каталога хранилища старше grace, пачками."""
+        try:
+            root = storage.path(directory)
+        except NotImplementedError:
+            # Файлы не на локальном диске: обходить нечего.
+            return
+        if not os.path.isdir(root):
+            return
+        deadline = time.time() - self.grace
+        batch = []
+        for entry in self._walk(root):
+            if entry.stat().st_mtime > deadline:
+                continue
+            name = os.path.relpath(entry.path, storage.location)
+            batch.append(name.replace(os.sep, "/"))
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def clean_files(self):
+        for names in self._old_files(
+            default.storage, thumbnail_settings.THUMBNAIL_PREFIX
+        ):
+            keys = {
+                add_prefix(ImageFile(name, default.storage).key): name
+                for name in names
+            }
+            known = set(KVStore.objects.filter(
+                key__in=list(keys)
+            ).values_list("key", flat=True))
+            for key, name in keys.items():
+                if key not in known:
+                    self._delete_file(name)
+
+    def clean_originals(self):
+        field = Post._meta.get_field("image")
+        for names in self._old_files(field.storage, field.upload_to):
+            live = set(Post.objects.filter(
+                image__in=names
+            ).values_list("image", flat=True))
+            for name in names:
+                if name not in live:
+                    self._delete_file(name, field.storage)
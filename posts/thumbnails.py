@@ -0,0 +1,196 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import Now
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile
+
+try:
+    # Регистрирует в Pillow формат AVIF.
+    import pillow_avif
+except ImportError:
+    pillow_avif = None
+
+from .caching import bump
+from .models import Post
+from .signals import post_namespaces
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+# Картинка -> время неудачной нарезки; до THUMBNAIL_RETRY_TIMEOUT после
+# неё повторно не пробуем.
+_failed = {}
+_lock = threading.Lock()
+
+
+class PostThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет искать готовую миниатюру и знает AVIF."""
+
+    def lookup(self, file_, geometry_string, **options):
+        name = self.thumbnail_name(file_, geometry_string, **options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+    def thumbnail_name(self, file_, geometry_string, **options):
+        # Опции дополняются так же, как в ThumbnailBackend.get_thumbnail,
+        # иначе имя файла миниатюры не совпадёт.
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = f"{key[:2]}/{key[2:4]}/{key}"
+        extension = EXTENSIONS.get(options["format"], "avif")
+        return f"{thumbnail_settings.THUMBNAIL_PREFIX}{path}.{extension}"
+
+
+backend = PostThumbnailBackend()
+
+
+def image_formats():
+    """Форматы для <source>; AVIF только при установленном плагине."""
+    return [
+        format_ for format_ in settings.POST_IMAGE_FORMATS
+        if format_ != "AVIF" or pillow_avif is not None
+    ]
+
+
+def variants():
+    """Все нарезки картинки поста: (формат, ширина, геометрия, опции).
+
+    Первая — запасная картинка для <img> в THUMBNAIL_FORMAT (JPEG),
+    остальные — ширины POST_IMAGE_WIDTHS в каждом из форматов.
+    """
+    width, height = settings.POST_IMAGE_SIZE
+    options = {"crop": "center", "upscale": True}
+    result = [(None, width, f"{width}x{height}", options)]
+    for format_ in image_formats():
+        for size in settings.POST_IMAGE_WIDTHS:
+            geometry = f"{size}x{round(size * height / width)}"
+            result.append((format_, size, geometry,
+                           dict(options, format=format_)))
+    return result
+
+
+def thumbnail_keys(source):
+    """Ключи KV-хранилища всех нарезок, которые сейчас нужны исходнику."""
+    return {
+        ImageFile(
+            backend.thumbnail_name(source, geometry, **dict(options)),
+            default.storage,
+        ).key
+        for format_, size, geometry, options in variants()
+    }
+
+
+def ready(post):
+    """Готовые нарезки картинки поста для <picture> или None.
+
+    Страница никогда не режет картинку сама: если хоть одной нарезки
+    нет, пост ставится в очередь, а шаблон показывает заглушку.
+    """
+    if not post.image:
+        return None
+    fallback = None
+    sources = {}
+    for format_, size, geometry, options in variants():
+        thumbnail = backend.lookup(post.image, geometry, **options)
+        if thumbnail is None:
+            schedule(post)
+            return None
+        if format_ is None:
+            fallback = thumbnail
+        else:
+            sources.setdefault(format_, []).append(
+                f"{thumbnail.url} {size}w"
+            )
+    return {
+        "src": fallback,
+        "sources": [
+            {"type": f"image/{format_.lower()}", "srcset": ", ".join(srcset)}
+            for format_, srcset in sources.items()
+        ],
+    }
+
+
+def schedule(post):
+    """Нарезать миниатюры в фоне после коммита текущей транзакции."""
+    if post.image:
+        transaction.on_commit(lambda: _submit(post.pk, post.image.name))
+
+
+def _submit(post_id, name):
+    global _executor
+    with _lock:
+        failed = _failed.get(name)
+        if failed is not None:
+            if time.monotonic() - failed < settings.THUMBNAIL_RETRY_TIMEOUT:
+                return
+            del _failed[name]
+        if name in _pending:
+            return
+        _pending.add(name)
+    if connection.vendor == "sqlite" and connection.is_in_memory_db():
+        # Потоки не могут делить in-memory SQLite (так бывает в тестах),
+        # поэтому нарезаем сразу.
+        _run(post_id, name, close=False)
+        return
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix="thumbnails",
+            )
+    _executor.submit(_run, post_id, name)
+
+
+def _run(post_id, name, close=True):
+    ok = False
+    try:
+        ok = generate(post_id)
+    except Exception:
+        logger.exception("Не удалось нарезать миниатюры для %s", name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+            if not ok:
+                _failed[name] = time.monotonic()
+        if close:
+            connection.close()
+
+
+def generate(post_id):
+    """Нарезать все размеры и сбросить закешированные карточки поста.
+
+    Возвращает False, если исходную картинку прочитать не удалось.
+    """
+    post = Post.objects.select_related("author", "group").filter(
+        pk=post_id
+    ).first()
+    if post is None or not post.image:
+        return True
+    for format_, size, geometry, options in variants():
+        backend.get_thumbnail(post.image, geometry, **dict(options))
+        # sorl глотает IOError и тогда не запоминает миниатюру.
+        if backend.lookup(post.image, geometry, **dict(options)) is None:
+            return False
+    Post.objects.filter(pk=post_id).update(modified=Now())
+    bump(*post_namespaces(post))
+    return True
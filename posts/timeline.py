@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Follow, Post, TimelineEntry, UserStats
+
+
+def is_celebrity(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list("user_id", flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post,
+                          author_id=post.author_id, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ),
+        ignore_conflicts=True,
+    )
+    trim(followers)
+
+
+def backfill(user_id, *author_ids):
+    """Добавляет в ленту недавние посты новых авторов (кроме популярных)."""
+    posts = Post.objects.filter(author_id__in=author_ids).exclude(
+        author__stats__followers_count__gte=settings.TIMELINE_FANOUT_LIMIT
+    ).order_by("-pub_date", "-id").values_list(
+        "pk", "author_id", "pub_date"
+    )[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=pk,
+                          author_id=author_id, pub_date=pub_date)
+            for pk, author_id, pub_date in posts
+        ),
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def refill_demoted(*author_ids):
+    """Раскладывает посты авторов, которые только что перестали быть
+    популярными.
+
+    Пока у автора было не меньше TIMELINE_FANOUT_LIMIT подписчиков, его
+    посты не раскладывались и читались на лету. Отписка, после которой
+    подписчиков стало на одного меньше порога, выключает чтение на лету,
+    поэтому эти посты надо разложить по лентам сейчас.
+    """
+    demoted = UserStats.objects.filter(
+        user_id__in=author_ids,
+        followers_count=settings.TIMELINE_FANOUT_LIMIT - 1,
+    ).values_list("user_id", flat=True)
+    for author_id in demoted:
+        posts = list(Post.objects.filter(author_id=author_id).order_by(
+            "-pub_date", "-id"
+        ).values_list("pk", "pub_date")[:settings.TIMELINE_LENGTH])
+        followers = list(Follow.objects.filter(
+            author_id=author_id
+        ).values_list("user_id", flat=True))
+        for user_id in followers:
+            TimelineEntry.objects.bulk_create(
+                (
+                    TimelineEntry(user_id=user_id, post_id=pk,
+                                  author_id=author_id, pub_date=pub_date)
+                    for pk, pub_date in posts
+                ),
+                ignore_conflicts=True,
+            )
+        trim(followers)
+
+
+def remove(user_id, *author_ids):
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+
+
+def trim(user_ids):
+    """Обрезает ленты длиннее TIMELINE_LENGTH (с запасом в 10%)."""
+    length = settings.TIMELINE_LENGTH
+    overflow = TimelineEntry.objects.filter(user_id__in=user_ids).values(
+        "user_id"
+    ).annotate(total=Count("pk")).filter(total__gt=length + length // 10)
+    for row in overflow:
+        entries = TimelineEntry.objects.filter(user_id=row["user_id"])
+        kept = entries.order_by("-pub_date", "-id").values(
+            "pub_date", "id"
+        )[length - 1:length]
+        for last in kept:
+            entries.filter(
+                Q(pub_date__lt=last["pub_date"])
+                | Q(pub_date=last["pub_date"], id__lt=last["id"])
+            ).delete()
+
+
+def rebuild(user):
+    TimelineEntry.objects.filter(user=user).delete()
+    authors = Follow.objects.filter(user=user).exclude(
+        author__stats__followers_count__gte=settings.TIMELINE_FANOUT_LIMIT
+    ).values("author")
+    posts = Post.objects.filter(author__in=authors).order_by(
+        "-pub_date", "-id"
+    ).values_list("pk", "author_id", "pub_date")[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user=user, post_id=pk, author_id=author_id,
+                          pub_date=pub_date)
+            for pk, author_id, pub_date in posts
+        ),
+    )
+
+
+def posts_for(user):
+    """Лента подписок: разложенные посты плюс посты популярных авторов."""
+    inbox = TimelineEntry.objects.filter(user=user).values("post")
+    celebrities = Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).values("author")
+    return Post.objects.filter(Q(pk__in=inbox) | Q(author__in=celebrities))
@@ -0,0 +1,98 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageOps
+
+
+class RejectedUpload(UploadedFile):
+    """Пустая заглушка вместо файла, который оказался слишком большим."""
+
+    def __init__(self, name, content_type, size):
+        super().__init__(BytesIO(), name, content_type, size)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """Первый в FILE_UPLOAD_HANDLERS: не пропускает лишние байты дальше.
+
+    Как только файл (по заявленной длине или по факту) превышает
+    POST_IMAGE_MAX_UPLOAD_SIZE, куски перестают передаваться следующим
+    обработчикам, а вместо файла в request.FILES попадает RejectedUpload.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.rejected = bool(
+            self.content_length
+            and self.content_length > settings.POST_IMAGE_MAX_UPLOAD_SIZE
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.rejected:
+            self.received += len(raw_data)
+            self.rejected = (
+                self.received > settings.POST_IMAGE_MAX_UPLOAD_SIZE
+            )
+        return None if self.rejected else raw_data
+
+    def file_complete(self, file_size):
+        if self.rejected:
+            return RejectedUpload(self.file_name, self.content_type, file_size)
+        return None
+
+
+def shrink(upload):
+    """Проверить размеры по заголовку и ужать слишком большую картинку.
+
+    Размеры берутся из заголовка без декодирования. Картинка с длинной
+    стороной больше POST_IMAGE_MAX_SIDE уменьшается (JPEG сразу читается
+    в уменьшенном масштабе) и перекодируется в тот же формат без
+    метаданных: EXIF, ICC-профиль и текстовые чанки PNG отбрасываются.
+    """
+    width, height = upload.image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Изображение слишком большое: %(width)s×%(height)s пикселей.",
+            code="too_many_pixels",
+            params={"width": width, "height": height},
+        )
+    side = settings.POST_IMAGE_MAX_SIDE
+    if max(width, height) <= side:
+        return upload
+    format_ = upload.image.format
+    jpeg = format_ in ("JPEG", "MPO")
+    upload.seek(0)
+    image = Image.open(upload)
+    if jpeg:
+        image.draft("RGB", (side, side))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert(_mode(image, jpeg))
+    image.thumbnail((side, side), Image.LANCZOS)
+    image.info = {}
+    buffer = BytesIO()
+    if jpeg:
+        image.save(buffer, "JPEG", quality=85, optimize=True)
+    else:
+        image.save(buffer, format_)
+    return SimpleUploadedFile(
+        upload.name, buffer.getvalue(), upload.content_type
+    )
+
+
+def _mode(image, jpeg):
+    """Режим, в котором картинку можно честно отмасштабировать.
+
+    Палитру и ч/б LANCZOS не сглаживает, поэтому всё, кроме L и RGB,
+    переводится в RGB, а с прозрачностью (RGBA, LA, палитра с
+    transparency) — в RGBA; JPEG прозрачности не умеет.
+    """
+    if image.mode in ("L", "RGB"):
+        return image.mode
+    if not jpeg and (
+        image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    ):
+        return "RGBA"
+    return "RGB"
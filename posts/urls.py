@@ -1,16 +1,31 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 urlpatterns = [
     path("", views.index, name="index"),
     path("group/<slug:slug>/", views.group_posts, name="group_posts"),
     path("new/", views.new_post, name="new_post"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("search/", views.search, name="search"),
+    path("api/posts/", api.index, name="api_index"),
+    path("api/group/<slug:slug>/", api.group_posts, name="api_group"),
+    path("api/follow/", api.follow_index, name="api_follow"),
+    path("api/following/", api.following, name="api_following"),
+    path("api/users/<str:username>/", api.profile, name="api_profile"),
+    path("api/users/<str:username>/followers/", api.followers,
+         name="api_followers"),
+    path("api/users/<str:username>/following/", api.following_list,
+         name="api_following_list"),
+    path("api/users/<str:username>/<int:post_id>/", api.post_view,
+         name="api_post"),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
+    path("<str:username>/followers/", views.followers, name="followers"),
+    path("<str:username>/following/", views.following, name="following"),
     path("<str:username>/follow/", views.profile_follow, name="profile_follow"), 
     path("<str:username>/unfollow/", views.profile_unfollow, name="profile_unfollow"),
     path("<username>/<int:post_id>/comment", views.add_comment, name="add_comment"),
+    path("<str:username>/<int:post_id>/comments/", views.post_comments, name="post_comments"),
     path('<str:username>/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     ]
\ No newline at end of file
@@ -1,53 +1,69 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse
-from django.views.generic import CreateView
-from .models import Post, Group, User, Comment, Follow
+from .models import User, Follow
 from .forms import PostForm, CommentForm
-from django.core.paginator import Paginator
+from .paginator import USERS_PER_PAGE, paginate, paginate_numbered
+from .search import SearchResults
+from . import feeds, follows, thumbnails
+from .caching import (cache_versioned, follow_list_namespaces,
+                      follow_namespaces, group_namespaces, index_namespaces,
+                      post_view_namespaces, profile_namespaces)
+from .conditional import conditional
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.db import transaction
 
 
-@cache_page(60 * 15, key_prefix="index_page")
+@conditional(index_namespaces, per_user=True)
+@cache_versioned(index_namespaces)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = feeds.index_feed()
+    paginator, page = paginate(request, post_list)
     return render(
         request,
         'index.html',
         {'page': page, 'paginator': paginator}
     )
 
+@conditional(group_namespaces, per_user=True)
+@cache_versioned(group_namespaces)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    group = feeds.get_group(slug)
+    post_list = feeds.group_feed(group)
+    paginator, page = paginate(request, post_list)
     return render(
         request,
         'group.html',
         {'page': page, 'paginator': paginator, 'group': group}
     )
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator, page = paginate_numbered(request, SearchResults(query))
+    return render(
+        request,
+        'search.html',
+        {'page': page, 'paginator': paginator, 'query': query}
+    )
+
 @login_required
+@transaction.atomic
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect('index')
     return render(request, 'new.html', {'form': form})
     
+@conditional(profile_namespaces, per_user=True)
+@cache_versioned(profile_namespaces)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+    post_list = feeds.profile_feed(author)
+    paginator, page = paginate(request, post_list)
     following = None
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -64,8 +80,9 @@ def profile(request, username):
         )
 
 @login_required
+@transaction.atomic
 def add_comment(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post = feeds.get_post(username, post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -75,22 +92,43 @@ def add_comment(request, username, post_id):
         return redirect('post', username=username, post_id=post_id)
     return render(request, 'comments.html', {'form': form, 'post': post})
 
+@conditional(post_view_namespaces, per_user=True)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post, comments_page = feeds.post_detail(
+        request, username, post_id, request.GET.get("cursor")
+    )
     comment_form = CommentForm()
     return render(
         request,
         'post.html',
-        {'post': post, 'author': post.author, 'comment_form': comment_form}
+        {'post': post, 'author': post.author, 'comment_form': comment_form,
+         'comments': comments_page.object_list,
+         'comments_page': comments_page}
         )
 
+@conditional(post_view_namespaces, per_user=True)
+def post_comments(request, username, post_id):
+    """Следующая страница комментариев кусочком HTML для подгрузки."""
+    post = feeds.get_post(username, post_id)
+    comments_page = feeds.comment_pages(post).get_page(
+        request.GET.get("cursor")
+    )
+    return render(
+        request,
+        'comment_list.html',
+        {'post': post, 'comments': comments_page.object_list,
+         'comments_page': comments_page}
+    )
+
 def post_edit(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post = feeds.get_post(username, post_id)
     if request.user != post.author:
         return redirect('post', username=post.author, post_id=post_id)
     form = PostForm(request.POST or None, files=request.FILES or None, instance=post)
     if form.is_valid():
         post = form.save()
+        if "image" in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('post', username=request.user.username, post_id=post_id)
     edit_flag = True
     return render(
@@ -112,11 +150,10 @@ def server_error(request):
     return render(request, "misc/500.html", status=500)
 
 @login_required
+@conditional(follow_namespaces, per_user=True)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = feeds.follow_feed(request.user)
+    paginator, page = paginate(request, post_list)
     return render(request, "follow.html", {
         'posts_list': post_list,
         'page': page,
@@ -124,17 +161,44 @@ def follow_index(request):
         }
     )
 
+def follow_list(request, username, feed, field, title):
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
+    _, page = paginate(
+        request, feed(author), USERS_PER_PAGE, feeds.FOLLOW_ORDERING
+    )
+    users = feeds.mark_followed(
+        request.user, [getattr(relation, field) for relation in page]
+    )
+    return render(request, 'follow_list.html', {
+        'author': author,
+        'page': page,
+        'users': users,
+        'title': title,
+        }
+    )
+
+@conditional(follow_list_namespaces, per_user=True)
+def followers(request, username):
+    return follow_list(
+        request, username, feeds.followers_feed, "user", "Подписчики"
+    )
+
+@conditional(follow_list_namespaces, per_user=True)
+def following(request, username):
+    return follow_list(
+        request, username, feeds.following_feed, "author", "Подписки"
+    )
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+    follows.follow(request.user, [author])
     return redirect("profile", username=username)
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    relation = Follow.objects.filter(user=request.user, author=author)
-    if relation.exists():
-        relation.delete()
+    follows.unfollow(request.user, [author])
     return redirect("profile", username=username)
\ No newline at end of file
@@ -0,0 +1,109 @@
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+class TwoTierCache(BaseCache):
+    """Небольшой кеш процесса (L1) перед общим кешем (L2).
+
+    Через L1 идут только ключи с префиксами из ``L1_PREFIXES``: это
+    должны быть ключи, в которые уже зашита версия данных (страницы,
+    карточки постов), иначе другие процессы увидят устаревшее значение
+    в течение ``L1_TIMEOUT`` секунд. Остальные ключи, в том числе сами
+    версии, читаются и пишутся прямо в L2.
+
+    OPTIONS:
+        L2 — алиас общего кеша из CACHES;
+        L1_TIMEOUT — сколько секунд держать значение в памяти процесса;
+        L1_PREFIXES — префиксы горячих ключей;
+        L1_MAX_ENTRIES — размер кеша процесса.
+    """
+
+    def __init__(self, location, params):
+        options = dict(params.get("OPTIONS", {}))
+        self.l2_alias = options.pop("L2", "shared")
+        self.l1_timeout = options.pop("L1_TIMEOUT", 5)
+        self.l1_prefixes = tuple(options.pop("L1_PREFIXES", ()))
+        l1_params = {
+            "TIMEOUT": self.l1_timeout,
+            "OPTIONS": {"MAX_ENTRIES": options.pop("L1_MAX_ENTRIES", 1000)},
+        }
+        super().__init__({**params, "OPTIONS": options})
+        self.l1 = LocMemCache(f"two-tier-l1:{location}", l1_params)
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    def _is_hot(self, key):
+        return key.startswith(self.l1_prefixes)
+
+    def _l1_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.l1_timeout
+        return min(timeout, self.l1_timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.add(key, value, timeout, version)
+
+    def get(self, key, default=None, version=None):
+        if not self._is_hot(key):
+            return self.l2.get(key, default, version)
+        sentinel = object()
+        value = self.l1.get(key, sentinel, version)
+        if value is sentinel:
+            value = self.l2.get(key, sentinel, version)
+            if value is sentinel:
+                return default
+            self.l1.set(key, value, self.l1_timeout, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        hot = [key for key in keys if self._is_hot(key)]
+        found = self.l1.get_many(hot, version) if hot else {}
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self.l2.get_many(missing, version)
+            promoted = {k: v for k, v in shared.items() if self._is_hot(k)}
+            if promoted:
+                self.l1.set_many(promoted, self.l1_timeout, version)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version)
+        if self._is_hot(key):
+            self.l1.set(key, value, self._l1_timeout(timeout), version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version)
+        hot = {k: v for k, v in data.items() if self._is_hot(k)}
+        if hot:
+            self.l1.set_many(hot, self._l1_timeout(timeout), version)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self.l1.delete(key, version)
+        self.l2.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        self.l1.delete_many(keys, version)
+        self.l2.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        if self._is_hot(key) and self.l1.has_key(key, version):
+            return True
+        return self.l2.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        return self.l2.incr(key, delta, version)
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
@@ -0,0 +1,249 @@
+import json
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (1, 2, 5, 10, 20, 50, 100, 200)
+
+_local = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Счётчики и гистограммы процесса в текстовом формате Prometheus.
+
+    У каждого воркера свои значения: Prometheus складывает их сам, если
+    опрашивает воркеры по отдельности.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        with self.lock:
+            self.counters[name, labels] += amount
+
+    def observe(self, name, labels, value, buckets=SECONDS):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[name, labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self):
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, (h.buckets, list(h.counts), h.sum, h.count))
+                for key, h in self.histograms.items()
+            )
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, bucket in zip((*buckets, "+Inf"), counts):
+                cumulative += bucket
+                lines.append(
+                    f"{name}_bucket{_labels(labels + (('le', bound),))} "
+                    f"{cumulative}"
+                )
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '%s="%s"' % (
+            key,
+            str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for key, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+REGISTRY = Registry()
+
+
+class Sample:
+    """Подробности одного запроса, попавшего в выборку."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.template_time = 0
+        self.template_depth = 0
+        self.cache = defaultdict(lambda: [0, 0])
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+def record_cache(kind, hits, misses):
+    """Учесть попадания и промахи кеша ``kind`` в текущем запросе."""
+    sample = getattr(_local, "sample", None)
+    if sample is not None:
+        counts = sample.cache[kind]
+        counts[0] += hits
+        counts[1] += misses
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        sample = getattr(_local, "sample", None)
+        if sample is None:
+            return super().render(context, request)
+        # Вложенные render_to_string уже входят во время внешнего.
+        sample.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            sample.template_depth -= 1
+            if not sample.template_depth:
+                sample.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, который замеряет рендеринг для метрик."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "<unresolved>"
+
+
+class MetricsMiddleware:
+    """Время каждого запроса по имени вьюхи плюс подробности для выборки.
+
+    Время и статус пишутся для всех запросов — это два вызова
+    perf_counter. Доля METRICS_SAMPLE_RATE запросов ещё и считает запросы
+    к базе, время рендеринга шаблонов и попадания в кеш и пишет строку
+    JSON в лог ``yatube.metrics``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "METRICS_SAMPLE_RATE", 0.01)
+
+    def __call__(self, request):
+        sampled = random.random() < self.sample_rate
+        started = time.perf_counter()
+        if not sampled:
+            response = self.get_response(request)
+        else:
+            sample = _local.sample = Sample()
+            try:
+                with connection.execute_wrapper(sample):
+                    response = self.get_response(request)
+            finally:
+                _local.sample = None
+        elapsed = time.perf_counter() - started
+        view = view_name(request)
+        if view == "metrics":
+            return response
+        REGISTRY.inc("yatube_requests_total", (
+            ("view", view),
+            ("method", request.method),
+            ("status", response.status_code),
+        ))
+        REGISTRY.observe(
+            "yatube_request_duration_seconds", (("view", view),), elapsed
+        )
+        if sampled:
+            self.record(request, response, view, elapsed, sample)
+        return response
+
+    def record(self, request, response, view, elapsed, sample):
+        labels = (("view", view),)
+        REGISTRY.inc("yatube_sampled_requests_total", labels)
+        REGISTRY.observe("yatube_db_queries", labels, sample.queries, QUERIES)
+        REGISTRY.observe("yatube_db_duration_seconds", labels, sample.db_time)
+        REGISTRY.observe(
+            "yatube_template_duration_seconds", labels, sample.template_time
+        )
+        for kind, (hits, misses) in sample.cache.items():
+            for result, amount in (("hit", hits), ("miss", misses)):
+                if amount:
+                    REGISTRY.inc("yatube_cache_requests_total", labels + (
+                        ("cache", kind), ("result", result),
+                    ), amount)
+        logger.info(json.dumps({
+            "view": view,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(elapsed * 1000, 2),
+            "db_queries": sample.queries,
+            "db_ms": round(sample.db_time * 1000, 2),
+            "template_ms": round(sample.template_time * 1000, 2),
+            "cache": {kind: {"hits": hits, "misses": misses}
+                      for kind, (hits, misses) in sample.cache.items()},
+        }, ensure_ascii=False))
+
+
+def metrics(request):
+    """Метрики процесса для Prometheus; доступны с METRICS_ALLOWED_IPS."""
+    allowed = getattr(settings, "METRICS_ALLOWED_IPS", ())
+    if request.META.get("REMOTE_ADDR") not in allowed:
+        raise Http404
+    return HttpResponse(
+        REGISTRY.render(), content_type="text/plain; version=0.0.4"
+    )
@@ -54,6 +54,7 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'yatube.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,7 +75,8 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.metrics.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [
             TEMPLATES_DIR,
             os.path.join((TEMPLATES_DIR), 'mini_helpers'),
@@ -156,8 +158,107 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 # указываю директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
-CACHES = {
-    'default': {
+# Общий для всех воркеров кеш выбирается переменной окружения YATUBE_CACHE:
+# locmem (по умолчанию, свой в каждом процессе), file (каталог на диске,
+# без внешних сервисов), memcached или redis (нужен django-redis).
+# Адрес/каталог задаётся в YATUBE_CACHE_LOCATION.
+CACHE_BACKEND = os.environ.get('YATUBE_CACHE', 'locmem')
+CACHE_LOCATION = os.environ.get('YATUBE_CACHE_LOCATION')
+
+SHARED_CACHES = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_LOCATION or os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': CACHE_LOCATION or '127.0.0.1:11211',
+    },
+    'redis': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': CACHE_LOCATION or 'redis://127.0.0.1:6379/1',
+    },
+}
+
+if CACHE_BACKEND == 'locmem':
+    CACHES = {'default': SHARED_CACHES['locmem']}
+else:
+    # Горячие ключи (страницы и карточки с версией в ключе) несколько
+    # секунд живут ещё и в памяти процесса.
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache_backends.TwoTierCache',
+            'OPTIONS': {
+                'L2': 'shared',
+                'L1_TIMEOUT': 10,
+                'L1_PREFIXES': ['page:', 'post_card:', 'post_detail:'],
+            },
+        },
+        'shared': SHARED_CACHES[CACHE_BACKEND],
     }
-}
\ No newline at end of file
+
+# Страницы лент сбрасываются сигналами моделей (posts.caching), поэтому
+# их можно держать в кеше долго.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Лента подписок: сколько записей хранить на пользователя и с какого
+# числа подписчиков посты автора не раскладываются по лентам, а читаются
+# при открытии страницы.
+TIMELINE_LENGTH = 500
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Миниатюры картинок постов нарезаются в фоне сразу после загрузки
+# (posts.thumbnails), шаблоны только ищут готовые. Карточка выводит
+# <picture>: варианты ширин POST_IMAGE_WIDTHS в форматах POST_IMAGE_FORMATS
+# (браузер берёт первый поддерживаемый; 'AVIF' работает только с
+# установленным pillow-avif-plugin) и запасную картинку POST_IMAGE_SIZE.
+POST_IMAGE_SIZE = (960, 339)
+POST_IMAGE_WIDTHS = [480, 960, 1440]
+POST_IMAGE_FORMATS = ['WEBP']
+THUMBNAIL_WORKERS = 2
+# Через сколько секунд снова пробовать картинку, которую не удалось нарезать.
+THUMBNAIL_RETRY_TIMEOUT = 10 * 60
+
+# Загрузка картинок (posts.uploads): файл больше POST_IMAGE_MAX_UPLOAD_SIZE
+# перестаёт приниматься уже при чтении запроса, картинка больше
+# POST_IMAGE_MAX_PIXELS отклоняется по заголовку, а с длинной стороной
+# больше POST_IMAGE_MAX_SIDE — уменьшается и перекодируется.
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 25 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 2560
+
+# Метрики (yatube.metrics): время каждого запроса по вьюхам, а у доли
+# METRICS_SAMPLE_RATE ещё запросы к базе, рендеринг шаблонов и кеш, плюс
+# строка JSON в лог yatube.metrics. /metrics в формате Prometheus отдаётся
+# только адресам из METRICS_ALLOWED_IPS.
+METRICS_SAMPLE_RATE = 0.01
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+# Строки JSON по выборке пишутся в консоль с уровнем INFO; выключить их
+# можно через YATUBE_METRICS_LOG_LEVEL=WARNING, а в тестах их глушит
+# TEST_RUNNER. Счётчики для /metrics собираются в любом случае.
+METRICS_LOG_LEVEL = os.environ.get('YATUBE_METRICS_LOG_LEVEL', 'INFO')
+TEST_RUNNER = 'yatube.test_runner.QuietMetricsRunner'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.metrics': {
+            'handlers': ['console'],
+            'level': METRICS_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
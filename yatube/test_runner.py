@@ -0,0 +1,11 @@
+import logging
+
+from django.test.runner import DiscoverRunner
+
+
+class QuietMetricsRunner(DiscoverRunner):
+    """Обычный раннер, но без строк метрик по выборке в выводе тестов."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        logging.getLogger('yatube.metrics').setLevel(logging.WARNING)
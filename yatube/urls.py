@@ -21,6 +21,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.conf import settings
 
+from yatube.metrics import metrics
+
 handler404 = "posts.views.page_not_found" # noqa
 handler500 = "posts.views.server_error" # noqa
 
@@ -34,6 +36,7 @@ urlpatterns = [
     path('about-us/', views.flatpage, {'url': '/about-us/'}, name='about'),
     path('about-author/', views.flatpage, {'url': '/about-author/'}, name='author'),
     path('about-spec/', views.flatpage, {'url': '/about-spec/'}, name='spec'),
+    path('metrics', metrics, name='metrics'),
     path("", include("posts.urls")),
     ]
 